@@ -0,0 +1,59 @@
+/**
+ * Throughput of the shared dimension tokenizer (lib/dims.js) on a million cells, against the
+ * regex + parseFloat parsing it replaced. Run: node bench_dims.js [count]
+ */
+
+const { tokenizeDims, parseDimsColumn } = require("./lib/dims.js");
+
+const COUNT = Number(process.argv[2]) || 1000000;
+
+const FORMATS = [
+  (l, w, h) => `${l}x${w}x${h}cm`,
+  (l, w, h) => `${l * 10}*${w * 10}*${h * 10}MM`,
+  (l, w, h) => `L${l} W${w} H${h}`,
+  (l, w, h) => `${(l / 2.54).toFixed(1)} x ${(w / 2.54).toFixed(1)} x ${(h / 2.54).toFixed(1)} in`,
+  (l, w, h) => `${l}×${w}×${h}`,
+  (l, w, h) => `${l}.5 x ${w} x ${h}.25 cm`
+];
+
+const values = new Array(COUNT);
+for (let i = 0; i < COUNT; i++) {
+  const l = 20 + (i % 80), w = 15 + (i % 50), h = 10 + (i % 40);
+  values[i] = FORMATS[i % FORMATS.length](l, w, h);
+}
+
+const time = (label, fn) => {
+  fn(); // warm up
+  const start = process.hrtime.bigint();
+  const check = fn();
+  const ms = Number(process.hrtime.bigint() - start) / 1e6;
+  const rate = (COUNT / ms / 1000).toFixed(2);
+  console.log(`${label.padEnd(34)} ${ms.toFixed(0).padStart(6)} ms  ${rate.padStart(6)} M cells/s  (check ${check.toFixed(0)})`);
+};
+
+console.log(`${COUNT.toLocaleString()} dimension strings, ${FORMATS.length} formats\n`);
+
+time("regex match + parseFloat (old)", () => {
+  let sum = 0;
+  for (let i = 0; i < COUNT; i++) {
+    const dims = values[i].match(/[\d.]+/g);
+    if (dims && dims.length >= 3) sum += parseFloat(dims[0]) + parseFloat(dims[1]) + parseFloat(dims[2]);
+  }
+  return sum;
+});
+
+time("tokenizeDims (reused out)", () => {
+  const out = { a: 0, b: 0, c: 0, unit: "" };
+  let sum = 0;
+  for (let i = 0; i < COUNT; i++) {
+    if (tokenizeDims(values[i], out) >= 3) sum += out.a + out.b + out.c;
+  }
+  return sum;
+});
+
+time("parseDimsColumn (units to cm)", () => {
+  const col = parseDimsColumn(values);
+  let sum = 0;
+  for (let i = 0; i < COUNT; i++) sum += col.L[i] + col.W[i] + col.H[i];
+  return sum;
+});
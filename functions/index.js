@@ -16,12 +16,19 @@ const { onRequest } = require("firebase-functions/v2/https");
 const admin = require("firebase-admin");
 const XLSX = require("xlsx");
 const ExcelJS = require("exceljs");
+const crypto = require("crypto");
+// lib/quote-extract.js (and the lib/dims.js it needs), copied in by sync_shared.js (firebase.json predeploy)
+const { quoteProductRows, scoreProductSheet, templateCandidates, templateFingerprint } = require("./shared/quote-extract");
+const { createMappingCache } = require("./mapping-cache");
 
 // Initialize admin if not already done
 if (!admin.apps.length) {
   admin.initializeApp();
 }
 
+// Mappings the model produced, by sheet layout (see mapping-cache.js)
+const mappingCache = createMappingCache({ getFirestore: () => admin.firestore() });
+
 // Required mapping fields for AI analysis
 const MAPPING_FIELDS = [
   "sku", "title", "price", "productLength", "productWidth", "productHeight",
@@ -29,112 +36,178 @@ const MAPPING_FIELDS = [
   "totalCartons", "grossWeight", "netWeight", "supplierCBM"
 ];
 
+// Product sheets of one workbook mapped by the AI at a time
+const SHEET_CONCURRENCY = 3;
+
+// Mapping tokens handed out by preview calls. Without MAPPING_TOKEN_SECRET set, tokens only
+// verify on the instance that issued them; a token that doesn't verify just means the
+// model is asked again.
+const MAPPING_TOKEN_TTL_MS = 30 * 60 * 1000;
+const MAPPING_TOKEN_SECRET = process.env.MAPPING_TOKEN_SECRET || crypto.randomBytes(32).toString("hex");
+const SHEET_REGION_ROWS = 25; // rows the prompt shows the model (buildAnalysisPrompt)
+
+// Products per line of a streamed (NDJSON) extract response
+const PRODUCT_BATCH_SIZE = 200;
+
 /**
  * Extract images from Excel file using ExcelJS
- * Returns array of image data with row associations
+ * Returns { sheetName: [image data with row associations] } for the named worksheets
+ * (the first worksheet when none are named)
  */
-async function extractImagesFromExcel(xlsxBuffer) {
+async function extractImagesFromExcel(xlsxBuffer, sheetNames = null) {
   console.log("🖼️  Starting image extraction with ExcelJS...");
   
   try {
     const workbook = new ExcelJS.Workbook();
     await workbook.xlsx.load(xlsxBuffer);
     
-    const worksheet = workbook.getWorksheet(1); // First worksheet
-    const images = [];
+    const worksheets = sheetNames
+      ? sheetNames.map(name => workbook.getWorksheet(name)).filter(Boolean)
+      : [workbook.worksheets[0]].filter(Boolean);
+    const bySheet = {};
+    for (const worksheet of worksheets) {
+      bySheet[worksheet.name] = extractWorksheetImages(workbook, worksheet, worksheets.length === 1);
+    }
+    return bySheet;
     
-    // Extract images from worksheet
-    if (worksheet.getImages) {
-      const worksheetImages = worksheet.getImages();
-      console.log(`Found ${worksheetImages.length} images in worksheet`);
-      
-      worksheetImages.forEach((image, index) => {
-        try {
-          const imageData = workbook.model.media[image.imageId];
-          if (imageData) {
-            // Convert image to base64 data URL
-            const base64 = imageData.buffer.toString('base64');
-            const mimeType = imageData.extension === 'png' ? 'image/png' : 
-                           imageData.extension === 'jpg' || imageData.extension === 'jpeg' ? 'image/jpeg' :
-                           imageData.extension === 'gif' ? 'image/gif' : 'image/png';
-            
-            const dataUrl = `data:${mimeType};base64,${base64}`;
-            
-            // Try to associate image with row based on position
-            let associatedRow = null;
-            if (image.range) {
-              // If image has range information, use it
-              associatedRow = image.range.tl.row + 1; // Convert to 1-based indexing
-            } else {
-              // Fallback: estimate row based on image index
-              associatedRow = index + 2; // Start from row 2 (after header)
-            }
-            
-            images.push({
-              index: index,
-              row: associatedRow,
-              dataUrl: dataUrl,
-              size: imageData.buffer.length,
-              type: mimeType,
-              extension: imageData.extension
-            });
-            
-            console.log(`Extracted image ${index + 1}: ${mimeType}, ${imageData.buffer.length} bytes, row ${associatedRow}`);
+  } catch (error) {
+    console.error("❌ Image extraction failed:", error.message);
+    return {};
+  }
+}
+
+/**
+ * Images anchored on one worksheet. With allMedia set (single-sheet workbooks), a sheet
+ * with no anchored images falls back to every media item in the workbook.
+ */
+function extractWorksheetImages(workbook, worksheet, allMedia) {
+  const images = [];
+  
+  // Extract images from worksheet
+  if (worksheet.getImages) {
+    const worksheetImages = worksheet.getImages();
+    console.log(`Found ${worksheetImages.length} images in worksheet`);
+    
+    worksheetImages.forEach((image, index) => {
+      try {
+        const imageData = workbook.model.media[image.imageId];
+        if (imageData) {
+          // Convert image to base64 data URL
+          const base64 = imageData.buffer.toString('base64');
+          const mimeType = imageData.extension === 'png' ? 'image/png' : 
+                         imageData.extension === 'jpg' || imageData.extension === 'jpeg' ? 'image/jpeg' :
+                         imageData.extension === 'gif' ? 'image/gif' : 'image/png';
+          
+          const dataUrl = `data:${mimeType};base64,${base64}`;
+          
+          // Try to associate image with row based on position
+          let associatedRow = null;
+          if (image.range) {
+            // If image has range information, use it
+            associatedRow = image.range.tl.row + 1; // Convert to 1-based indexing
+          } else {
+            // Fallback: estimate row based on image index
+            associatedRow = index + 2; // Start from row 2 (after header)
           }
+          
+          images.push({
+            index: index,
+            row: associatedRow,
+            dataUrl: dataUrl,
+            size: imageData.buffer.length,
+            type: mimeType,
+            extension: imageData.extension
+          });
+          
+          console.log(`Extracted image ${index + 1}: ${mimeType}, ${imageData.buffer.length} bytes, row ${associatedRow}`);
+        }
+      } catch (err) {
+        console.warn(`Failed to extract image ${index}:`, err.message);
+      }
+    });
+  }
+  
+  // Alternative: Check for embedded media in workbook
+  if (workbook.model && workbook.model.media) {
+    console.log(`Found ${workbook.model.media.length} media items in workbook`);
+    
+    // If no images found via worksheet, try to extract all media
+    if (images.length === 0 && allMedia) {
+      workbook.model.media.forEach((media, index) => {
+        try {
+          const base64 = media.buffer.toString('base64');
+          const mimeType = media.extension === 'png' ? 'image/png' : 
+                         media.extension === 'jpg' || media.extension === 'jpeg' ? 'image/jpeg' :
+                         media.extension === 'gif' ? 'image/gif' : 'image/png';
+          
+          const dataUrl = `data:${mimeType};base64,${base64}`;
+          
+          images.push({
+            index: index,
+            row: index + 2, // Estimate row
+            dataUrl: dataUrl,
+            size: media.buffer.length,
+            type: mimeType,
+            extension: media.extension
+          });
+          
+          console.log(`Extracted media ${index + 1}: ${mimeType}, ${media.buffer.length} bytes`);
         } catch (err) {
-          console.warn(`Failed to extract image ${index}:`, err.message);
+          console.warn(`Failed to extract media ${index}:`, err.message);
         }
       });
     }
-    
-    // Alternative: Check for embedded media in workbook
-    if (workbook.model && workbook.model.media) {
-      console.log(`Found ${workbook.model.media.length} media items in workbook`);
-      
-      // If no images found via worksheet, try to extract all media
-      if (images.length === 0) {
-        workbook.model.media.forEach((media, index) => {
-          try {
-            const base64 = media.buffer.toString('base64');
-            const mimeType = media.extension === 'png' ? 'image/png' : 
-                           media.extension === 'jpg' || media.extension === 'jpeg' ? 'image/jpeg' :
-                           media.extension === 'gif' ? 'image/gif' : 'image/png';
-            
-            const dataUrl = `data:${mimeType};base64,${base64}`;
-            
-            images.push({
-              index: index,
-              row: index + 2, // Estimate row
-              dataUrl: dataUrl,
-              size: media.buffer.length,
-              type: mimeType,
-              extension: media.extension
-            });
-            
-            console.log(`Extracted media ${index + 1}: ${mimeType}, ${media.buffer.length} bytes`);
-          } catch (err) {
-            console.warn(`Failed to extract media ${index}:`, err.message);
-          }
-        });
-      }
-    }
-    
-    console.log(`✅ Image extraction complete: ${images.length} images extracted`);
-    return images;
-    
-  } catch (error) {
-    console.error("❌ Image extraction failed:", error.message);
-    return [];
   }
+  
+  console.log(`✅ Image extraction complete: ${images.length} images extracted from "${worksheet.name}"`);
+  return images;
 }
 
 /**
- * Extract text content from XLSX workbook for AI analysis
+ * Extract text content from every sheet of an XLSX workbook for AI analysis
  */
-function extractSheetData(xlsxData) {
+function extractWorkbookSheets(xlsxData) {
   const workbook = XLSX.read(xlsxData, { type: "base64" });
-  const sheetName = workbook.SheetNames[0];
-  const worksheet = workbook.Sheets[sheetName];
+  return workbook.SheetNames.map((sheetName, k) => ({
+    ...extractSheetData(workbook.Sheets[sheetName], sheetName),
+    hidden: !!(workbook.Workbook && workbook.Workbook.Sheets && workbook.Workbook.Sheets[k] && workbook.Workbook.Sheets[k].Hidden)
+  }));
+}
+
+/**
+ * Sheets worth mapping: visible ones that score as a product table (scoreProductSheet),
+ * in workbook order. Only hidden sheets scoring -> the best of those; nothing scoring ->
+ * the first sheet, as before multi-sheet support.
+ */
+function productSheets(sheets) {
+  const scored = sheets.map(sheet => ({ sheet, score: scoreProductSheet(sheet.data).score }));
+  const found = scored.filter(s => s.score > 0);
+  const visible = found.filter(s => !s.sheet.hidden);
+  if (visible.length) return visible.map(s => s.sheet);
+  if (found.length) return [found.reduce((a, b) => (b.score > a.score ? b : a)).sheet];
+  return sheets.slice(0, 1);
+}
+
+/**
+ * Run fn(item, index) over items with at most limit calls in flight; results in item order
+ */
+async function runLimited(items, limit, fn) {
+  const results = new Array(items.length);
+  let next = 0;
+  const lane = async () => {
+    while (next < items.length) {
+      const i = next++;
+      results[i] = await fn(items[i], i);
+    }
+  };
+  await Promise.all(Array.from({ length: Math.min(limit, items.length) }, lane));
+  return results;
+}
+
+/**
+ * Extract text content from one worksheet for AI analysis
+ */
+function extractSheetData(worksheet, sheetName) {
 
   // Get raw data as JSON
   const jsonData = XLSX.utils.sheet_to_json(worksheet, {
@@ -269,6 +342,80 @@ function normalizeMapping(mapping) {
   return normalized;
 }
 
+/**
+ * Hash of the rows the model sees when mapping a sheet, so a mapping token is only
+ * accepted for the sheet it was issued for
+ */
+function sheetRegionHash(sheetData) {
+  const region = JSON.stringify(sheetData.data.slice(0, SHEET_REGION_ROWS));
+  return crypto.createHash("sha256").update(region).digest("base64url").slice(0, 22);
+}
+
+const signMappingPayload = (payload) =>
+  crypto.createHmac("sha256", MAPPING_TOKEN_SECRET).update(payload).digest("base64url");
+
+/**
+ * Signed token for a preview's mapping: the extract call sends it back instead of having
+ * the model map the same rows again
+ */
+function issueMappingToken(sheetData, aiMapping) {
+  const payload = Buffer.from(JSON.stringify({
+    mapping: aiMapping.mapping,
+    headerRow: aiMapping.headerRow,
+    confidence: aiMapping.confidence ?? null,
+    notes: aiMapping.notes ?? null,
+    region: sheetRegionHash(sheetData),
+    expires: Date.now() + MAPPING_TOKEN_TTL_MS
+  })).toString("base64url");
+  return `${payload}.${signMappingPayload(payload)}`;
+}
+
+/**
+ * The mapping inside a token, or null when the token is malformed, expired, signed with
+ * another secret or issued for different rows
+ */
+function readMappingToken(token, sheetData) {
+  if (typeof token !== "string") return null;
+  const [payload, signature] = token.split(".");
+  if (!payload || !signature) return null;
+  const expected = Buffer.from(signMappingPayload(payload));
+  const given = Buffer.from(signature);
+  if (given.length !== expected.length || !crypto.timingSafeEqual(given, expected)) return null;
+  try {
+    const data = JSON.parse(Buffer.from(payload, "base64url").toString("utf8"));
+    if (!(data.expires > Date.now()) || data.region !== sheetRegionHash(sheetData)) return null;
+    return {
+      mapping: normalizeMapping(data.mapping || {}),
+      headerRow: data.headerRow,
+      confidence: data.confidence,
+      notes: data.notes
+    };
+  } catch (err) {
+    return null;
+  }
+}
+
+/**
+ * A mapping the caller already has for this sheet: one it confirmed or edited ({ mapping,
+ * headerRow }) or a preview's token ({ mappingToken }). Returns { aiMapping, source } or
+ * null when the model has to map the sheet.
+ */
+function confirmedMapping(sheetData, confirmed) {
+  if (!confirmed) return null;
+  if (confirmed.mapping && typeof confirmed.mapping === "object") {
+    const mapping = normalizeMapping(confirmed.mapping);
+    Object.values(mapping).forEach(field => {
+      if (!(Number.isInteger(field.col) && field.col >= 0)) field.col = null;
+    });
+    const headerRow = Number.isInteger(confirmed.headerRow) && confirmed.headerRow >= 0 ? confirmed.headerRow : 0;
+    return { aiMapping: { mapping, headerRow, confidence: confirmed.confidence ?? null, notes: null }, source: "client" };
+  }
+  const aiMapping = readMappingToken(confirmed.mappingToken, sheetData);
+  if (aiMapping) return { aiMapping, source: "token" };
+  if (confirmed.mappingToken) console.warn(`Mapping token for "${sheetData.sheetName}" not accepted, asking the model`);
+  return null;
+}
+
 /**
  * Parse AI response to extract JSON (tolerant of LLM quirks)
  */
@@ -343,59 +490,30 @@ function parseAIResponse(responseText) {
  * Extract product data based on AI mapping
  */
 function extractProducts(sheetData, mapping, headerRow, extractedImages = []) {
-  console.log(`Extracting products starting at row ${headerRow + 1}`);
-  console.log(`Extracting products starting at row ${headerRow + 1}`);
-  const dataRows = sheetData.data.slice(headerRow + 1);
-
-  // LOG DATA DUMP
-  console.log("DATA DUMP (First 3 rows):", JSON.stringify(dataRows.slice(0, 3)));
-
   const products = [];
+  for (const batch of extractProductBatches(sheetData, mapping, headerRow, extractedImages)) {
+    for (const product of batch) products.push(product);
+  }
+  return products;
+}
 
-  for (let i = 0; i < dataRows.length; i++) {
-    const row = dataRows[i];
-
-    // Skip empty rows
-    if (!row || !row.some(c => c && String(c).trim())) continue;
-
-    const product = {
-      sku: "",
-      title: "",
-      unitPrice: 0,
-      // Product dimensions (reference only)
-      productLength: 0,
-      productWidth: 0,
-      productHeight: 0,
-      productSource: "",
-      // Carton dimensions (for freight)
-      cartonLength: 0,
-      cartonWidth: 0,
-      cartonHeight: 0,
-      cartonSource: "",
-      // Packing
-      pack: 1,
-      pack_text: "",
-      totalCartons: null,
-      // Weight
-      grossWeight: 0,
-      netWeight: null,
-      weightUnit: "kg",
-      // CBM
-      supplierCBM: null,
-      cbmSource: "",
-      // Fallback dims text
-      dims_text: "",
-      // Image data
-      image: null,
-      imageUrl: null
-    };
+/**
+ * The same products, batchSize at a time as the rows are read, so a streamed response
+ * can send each batch before the next is built. Rows are turned into products by the
+ * shared quoteProductRows (lib/quote-extract.js, also used by the page); this adds images.
+ */
+function* extractProductBatches(sheetData, mapping, headerRow, extractedImages = [], batchSize = PRODUCT_BATCH_SIZE) {
+  console.log(`Extracting products starting at row ${headerRow + 1}`);
+  console.log("DATA DUMP (First 3 rows):", JSON.stringify(sheetData.data.slice(headerRow + 1, headerRow + 4)));
 
+  const products = [];
+  for (const { row: i, product } of quoteProductRows(sheetData.data, mapping, headerRow)) {
     // Associate image with product row
     const currentRow = headerRow + 1 + i + 1; // Convert to 1-based Excel row
-    const associatedImage = extractedImages.find(img => 
+    const associatedImage = extractedImages.find(img =>
       Math.abs(img.row - currentRow) <= 1 // Allow 1 row tolerance for positioning
     );
-    
+
     if (associatedImage) {
       product.image = associatedImage.dataUrl;
       product.imageUrl = associatedImage.dataUrl;
@@ -407,224 +525,100 @@ function extractProducts(sheetData, mapping, headerRow, extractedImages = []) {
       console.log(`🖼️  Sequential image assignment for product ${i + 1}`);
     }
 
-    // Extract SKU with intelligent fallback (safe null check)
-    const skuCol = mapping?.sku?.col;
-    if (skuCol != null) {
-      product.sku = String(row[skuCol] || "").trim();
-    }
-    
-    // INTELLIGENT SKU FALLBACK: If no SKU found, look for product codes
-    if (!product.sku && row && row.length > 0) {
-      for (let colIdx = 0; colIdx < row.length; colIdx++) {
-        const cellValue = String(row[colIdx] || "").trim();
-        // Look for SKU patterns: alphanumeric codes, prefixed codes, etc.
-        if (cellValue && (
-            /^[A-Z]{2,5}\d+/.test(cellValue) || // PSP001, COMP002, etc.
-            /^[A-Z0-9-]{4,15}$/.test(cellValue) || // General alphanumeric codes
-            /^\d{4,10}$/.test(cellValue) // Numeric codes
-          )) {
-          product.sku = cellValue;
-          console.log(`Intelligent SKU fallback for row ${i}: "${cellValue}"`);
-          break;
-        }
-      }
-    }
-
-    // Extract title with intelligent fallback (safe null check)
-    const titleCol = mapping?.title?.col;
-    if (titleCol != null) {
-      product.title = String(row[titleCol] || "").trim();
-    }
-    
-    // INTELLIGENT TITLE FALLBACK: If no title found, look for longest text field
-    if (!product.title && row && row.length > 0) {
-      let longestText = "";
-      let longestLength = 0;
-      
-      for (let colIdx = 0; colIdx < row.length; colIdx++) {
-        const cellValue = String(row[colIdx] || "").trim();
-        // Skip if it's clearly not a title (numbers, short codes, dimensions)
-        if (cellValue.length > longestLength && 
-            cellValue.length > 10 && // Must be reasonably long
-            !/^\d+(\.\d+)?$/.test(cellValue) && // Not just a number
-            !/^\d+x\d+x\d+/.test(cellValue) && // Not dimensions
-            !/^[A-Z]{2,5}\d+$/.test(cellValue) && // Not a simple SKU pattern
-            !cellValue.match(/^\d+\s*(PC|PCS|SET|KG|G|CM|MM)$/i)) { // Not quantity/measurement
-          longestText = cellValue;
-          longestLength = cellValue.length;
-        }
-      }
-      
-      if (longestText) {
-        product.title = longestText;
-        console.log(`Intelligent title fallback for row ${i}: "${longestText}"`);
-      }
-    }
-
-    // Extract price with intelligent fallback (safe null check)
-    const priceCol = mapping?.price?.col;
-    if (priceCol != null) {
-      const priceStr = String(row[priceCol] || "");
-      product.unitPrice = parseFloat(priceStr.replace(/[^0-9.-]/g, "")) || 0;
-    }
-    
-    // INTELLIGENT PRICE FALLBACK: If no price found, look for monetary values
-    if (product.unitPrice === 0 && row && row.length > 0) {
-      for (let colIdx = 0; colIdx < row.length; colIdx++) {
-        const cellValue = String(row[colIdx] || "").trim();
-        // Look for price patterns: numbers with currency symbols, decimal prices
-        if (cellValue && (
-            /^\$?\d+(\.\d{1,2})?$/.test(cellValue) || // $12.50 or 12.50
-            /^\d+[.,]\d{2}$/.test(cellValue) || // 12,50 or 12.50
-            /^USD?\s*\d+(\.\d{1,2})?/.test(cellValue) // USD 12.50
-          )) {
-          const price = parseFloat(cellValue.replace(/[^0-9.-]/g, ""));
-          if (price > 0 && price < 10000) { // Reasonable price range
-            product.unitPrice = price;
-            console.log(`Intelligent price fallback for row ${i}: ${price}`);
-            break;
-          }
-        }
-      }
-    }
-
-    // Extract PRODUCT dimensions (reference) - safe null checks
-    const productLengthCol = mapping?.productLength?.col;
-    if (productLengthCol != null) {
-      const dimStr = String(row[productLengthCol] || "");
-      const dims = dimStr.match(/[\d.]+/g);
-      if (dims && dims.length >= 3) {
-        product.productLength = parseFloat(dims[0]) || 0;
-        product.productWidth = parseFloat(dims[1]) || 0;
-        product.productHeight = parseFloat(dims[2]) || 0;
-        product.productSource = mapping.productLength.name || "";
-      } else {
-        const productWidthCol = mapping?.productWidth?.col;
-        const productHeightCol = mapping?.productHeight?.col;
-        
-        product.productLength = productLengthCol != null ? parseFloat(String(row[productLengthCol]).replace(/[^0-9.-]/g, "")) || 0 : 0;
-        product.productWidth = productWidthCol != null ? parseFloat(String(row[productWidthCol]).replace(/[^0-9.-]/g, "")) || 0 : 0;
-        product.productHeight = productHeightCol != null ? parseFloat(String(row[productHeightCol]).replace(/[^0-9.-]/g, "")) || 0 : 0;
-      }
-    }
+    products.push(product);
+    if (products.length >= batchSize) yield products.splice(0);
+  }
 
-    // Extract CARTON dimensions (freight - PRIORITY) - safe null checks
-    const cartonLengthCol = mapping?.cartonLength?.col;
-    const cartonWidthCol = mapping?.cartonWidth?.col;
-    const cartonHeightCol = mapping?.cartonHeight?.col;
-    
-    // Try combined dimension string first (e.g., "25x20x15")
-    let combinedDimensionsFound = false;
-    if (cartonLengthCol != null) {
-      const dimStr = String(row[cartonLengthCol] || "");
-      const dims = dimStr.match(/[\d.]+/g);
-      console.log(`Carton dimension parsing: "${dimStr}" -> [${dims?.join(', ') || 'no matches'}]`);
-      if (dims && dims.length >= 3) {
-        product.cartonLength = parseFloat(dims[0]) || 0;
-        product.cartonWidth = parseFloat(dims[1]) || 0;
-        product.cartonHeight = parseFloat(dims[2]) || 0;
-        product.cartonSource = mapping.cartonLength.name || "";
-        combinedDimensionsFound = true;
-        console.log(`Combined dimensions found: ${product.cartonLength}×${product.cartonWidth}×${product.cartonHeight}`);
-      } else {
-        // Single dimension value
-        product.cartonLength = parseFloat(dimStr.replace(/[^0-9.-]/g, "")) || 0;
-      }
-    }
-    
-    // Extract individual width/height if mapped separately AND combined dimensions not found
-    if (!combinedDimensionsFound && cartonWidthCol != null && cartonWidthCol !== cartonLengthCol) {
-      const dimStr = String(row[cartonWidthCol] || "");
-      const width = parseFloat(dimStr.replace(/[^0-9.-]/g, "")) || 0;
-      if (width > 0) {
-        product.cartonWidth = width;
-      }
-    }
-    
-    if (!combinedDimensionsFound && cartonHeightCol != null && cartonHeightCol !== cartonLengthCol) {
-      const dimStr = String(row[cartonHeightCol] || "");
-      const height = parseFloat(dimStr.replace(/[^0-9.-]/g, "")) || 0;
-      if (height > 0) {
-        product.cartonHeight = height;
-      }
-    }
+  if (products.length) yield products;
+}
 
-    // Dims text fallback (safe null check)
-    const dimsTextCol = mapping?.dims_text?.col;
-    if (dimsTextCol != null) {
-      product.dims_text = String(row[dimsTextCol] || "");
-    }
+/**
+ * Ask the model for one sheet's column mapping
+ * Returns the parsed { mapping, headerRow, confidence, notes } with every mapping field present
+ */
+async function analyzeSheetMapping(sheetData, accessToken) {
+  console.log(`Processing "${sheetData.sheetName}": ${sheetData.rowCount} rows, ${sheetData.colCount} columns`);
+
+  // Build prompt
+  const prompt = buildAnalysisPrompt(sheetData);
+
+  console.log("Generating AI content via REST API...");
+
+  const projectId = "landed-calculator";
+  const location = "us-central1";
+  const modelId = "gemini-2.5-flash";
+  const apiEndpoint = `https://${location}-aiplatform.googleapis.com/v1beta1/projects/${projectId}/locations/${location}/publishers/google/models/${modelId}:generateContent`;
+
+  const requestBody = {
+    contents: [{
+      role: "user",
+      parts: [{ text: prompt }]
+    }],
+    generationConfig: {
+      temperature: 0.1,
+      topP: 0.9,
+      maxOutputTokens: 4096
+    },
+    // Gemini 3 Flash: Enhanced system instruction for better reasoning
+    systemInstruction: {
+      parts: [{
+        text: `You are an expert data analyst specializing in supplier spreadsheet analysis with advanced pattern recognition capabilities. 
 
-    // Extract pack (safe null check)
-    const packCol = mapping?.pack?.col;
-    if (packCol != null) {
-      const packStr = String(row[packCol] || "");
-      product.pack_text = packStr;
-
-      // INTELLIGENT PACK PARSING
-      const packRaw = packStr.toUpperCase();
-      console.log(`Pack parsing: "${packStr}" -> "${packRaw}"`);
-
-      // Extract number followed by PC, PCS, SET, etc.
-      const match = packRaw.match(/(\d+)\s*(PC|PCS|SET|PACK|PIECE)/);
-      if (match && match[1]) {
-        product.pack = parseInt(match[1]);
-        console.log(`Pack regex match: ${match[1]} -> ${product.pack}`);
-      } else {
-        // Fallback: extract any number from the string
-        const numberMatch = packStr.match(/\d+/);
-        if (numberMatch) {
-          product.pack = parseInt(numberMatch[0]);
-          console.log(`Pack fallback: ${numberMatch[0]} -> ${product.pack}`);
-        } else {
-          product.pack = 1; // Default
-          console.log(`Pack default: 1`);
-        }
-      }
-    }
+CORE EXPERTISE:
+- Intelligent column mapping beyond simple keyword matching
+- Complex data pattern recognition across varied supplier formats
+- Robust handling of messy, inconsistent spreadsheet layouts
+- Advanced dimension parsing (combined strings, separate columns, mixed units)
+- Multi-language product description analysis
+- Currency and measurement unit standardization
 
-    // Extract total cartons (for split packing) - safe null check
-    const totalCartonsCol = mapping?.totalCartons?.col;
-    if (totalCartonsCol != null) {
-      product.totalCartons = parseInt(String(row[totalCartonsCol]).replace(/[^0-9]/g, "")) || null;
-    }
+ANALYSIS APPROACH:
+1. DEEP PATTERN ANALYSIS: Look for data consistency patterns, not just keywords
+2. CONTEXTUAL REASONING: Use surrounding data to infer column purposes
+3. INTELLIGENT FALLBACKS: When primary mapping fails, use secondary indicators
+4. VALIDATION: Cross-reference extracted data for logical consistency
 
-    // Extract weight (safe null checks)
-    const grossWeightCol = mapping?.grossWeight?.col;
-    if (grossWeightCol != null) {
-      const weightStr = String(row[grossWeightCol] || "");
-      product.grossWeight = parseFloat(weightStr.replace(/[^0-9.-]/g, "")) || 0;
-      product.weightUnit = mapping.grossWeight.unit || "kg";
+OUTPUT REQUIREMENTS:
+- Return ONLY valid JSON with exact field structure
+- Ensure all required mapping fields are present
+- Use null for unmapped fields, never omit them
+- Include confidence indicators in your reasoning process`
+      }]
     }
+  };
 
-    const netWeightCol = mapping?.netWeight?.col;
-    if (netWeightCol != null) {
-      const weightStr = String(row[netWeightCol] || "");
-      product.netWeight = parseFloat(weightStr.replace(/[^0-9.-]/g, "")) || null;
-    }
+  const aiResponse = await fetch(apiEndpoint, {
+    method: "POST",
+    headers: {
+      "Authorization": `Bearer ${accessToken}`,
+      "Content-Type": "application/json"
+    },
+    body: JSON.stringify(requestBody)
+  });
 
-    // Extract supplier CBM (safe null check)
-    const supplierCBMCol = mapping?.supplierCBM?.col;
-    if (supplierCBMCol != null) {
-      const cbmStr = String(row[supplierCBMCol] || "");
-      product.supplierCBM = parseFloat(cbmStr.replace(/[^0-9.-]/g, "")) || null;
-      product.cbmSource = mapping.supplierCBM.name || "";
-    }
+  if (!aiResponse.ok) {
+    const errorText = await aiResponse.text();
+    throw new Error(`Vertex AI REST Error ${aiResponse.status}: ${errorText}`);
+  }
 
-    // Only add products with valid SKU or price
-    // Only add products with valid SKU, Price, OR Dimensions
-    // Relaxed constraint: If we have physical dimensions, it's likely a product.
-    const hasDims = (product.productLength && product.productWidth) || (product.cartonLength && product.cartonWidth);
+  const responseJson = await aiResponse.json();
 
-    if (product.sku || product.unitPrice > 0 || hasDims) {
-      products.push(product);
-    } else {
-      // Log skipped row for debugging
-      if (i < 50) console.log(`Skipped row ${i} - SKU: "${product.sku}", Price: ${product.unitPrice}, Dims: ${hasDims}`);
-    }
+  // SAFETY CHECK: Ensure we have content
+  if (!responseJson.candidates || responseJson.candidates.length === 0 || !responseJson.candidates[0].content || !responseJson.candidates[0].content.parts || responseJson.candidates[0].content.parts.length === 0) {
+    console.error("AI returned empty response or was blocked:", JSON.stringify(responseJson));
+    throw new Error("AI service returned an empty response. This might be due to safety filters.");
   }
 
-  return products;
+  const responseText = responseJson.candidates[0].content.parts[0].text;
+  console.log("AI Response received (length: " + responseText.length + ")");
+
+  // Parse AI response
+  const aiMapping = parseAIResponse(responseText);
+  
+  // Normalize mapping to ensure all fields exist
+  aiMapping.mapping = normalizeMapping(aiMapping.mapping);
+  console.log("Normalized Mapping:", JSON.stringify(aiMapping.mapping));
+  return aiMapping;
 }
 
 /**
@@ -645,19 +639,20 @@ exports.analyzeQuoteSheetV2 = onRequest(
     
     // Native CORS handled via options above.
     try {
-      const { rows, xlsxBase64, preview } = req.body;
-      let sheetData;
-      let extractedImages = [];
+      const { rows, xlsxBase64, preview, stream, sheetName, mappingToken, mapping, headerRow, sheetMappings, refreshMapping } = req.body;
+      const started = Date.now();
+      let sheets;
+      let extractedImages = {};
 
       if (rows && Array.isArray(rows)) {
         console.log("Using provided rows (Lightweight JSON mode)");
-        sheetData = {
-          sheetName: "Imported Data",
+        sheets = [{
+          sheetName: sheetName || "Imported Data",
           headers: rows[0] || [],
           data: rows,
           rowCount: rows.length,
           colCount: rows[0]?.length || 0
-        };
+        }];
         
         // For rows mode, we don't have the original Excel file for image extraction
         console.log("⚠️  Rows mode: No image extraction possible without original Excel file");
@@ -665,17 +660,22 @@ exports.analyzeQuoteSheetV2 = onRequest(
       } else if (xlsxBase64) {
         console.log("Parsing XLSX file (Full Excel mode with image extraction)...");
         
-        // Extract text data using XLSX
-        sheetData = extractSheetData(xlsxBase64);
+        // Extract text data from every sheet using XLSX, keep the product tables
+        const allSheets = extractWorkbookSheets(xlsxBase64);
+        sheets = productSheets(allSheets);
+        console.log(`Workbook sheets: ${allSheets.length}, product sheets: ${sheets.map(s => s.sheetName).join(", ")}`);
         
-        // Extract images using ExcelJS
-        try {
-          const xlsxBuffer = Buffer.from(xlsxBase64, 'base64');
-          extractedImages = await extractImagesFromExcel(xlsxBuffer);
-          console.log(`🖼️  Extracted ${extractedImages.length} images from Excel file`);
-        } catch (imageError) {
-          console.warn("⚠️  Image extraction failed, continuing without images:", imageError.message);
-          extractedImages = [];
+        // Extract images using ExcelJS (only products carry them, so previews skip this)
+        if (!preview) {
+          try {
+            const xlsxBuffer = Buffer.from(xlsxBase64, 'base64');
+            extractedImages = await extractImagesFromExcel(xlsxBuffer, sheets.map(s => s.sheetName));
+            const count = Object.values(extractedImages).reduce((n, list) => n + list.length, 0);
+            console.log(`🖼️  Extracted ${count} images from Excel file`);
+          } catch (imageError) {
+            console.warn("⚠️  Image extraction failed, continuing without images:", imageError.message);
+            extractedImages = {};
+          }
         }
         
       } else {
@@ -683,93 +683,135 @@ exports.analyzeQuoteSheetV2 = onRequest(
         return;
       }
 
-      console.log(`Processing ${sheetData.rowCount} rows, ${sheetData.colCount} columns`);
-
-      // 2. Build prompt
-      const prompt = buildAnalysisPrompt(sheetData);
-
-      console.log("Generating AI content via REST API...");
-
-      // Get Access Token via Firebase Admin
-      const token = await admin.credential.applicationDefault().getAccessToken();
-      const accessToken = token.access_token;
-
-      const projectId = "landed-calculator";
-      const location = "us-central1";
-      const modelId = "gemini-2.5-flash";
-      const apiEndpoint = `https://${location}-aiplatform.googleapis.com/v1beta1/projects/${projectId}/locations/${location}/publishers/google/models/${modelId}:generateContent`;
-
-      const requestBody = {
-        contents: [{
-          role: "user",
-          parts: [{ text: prompt }]
-        }],
-        generationConfig: {
-          temperature: 0.1,
-          topP: 0.9,
-          maxOutputTokens: 4096
-        },
-        // Gemini 3 Flash: Enhanced system instruction for better reasoning
-        systemInstruction: {
-          parts: [{
-            text: `You are an expert data analyst specializing in supplier spreadsheet analysis with advanced pattern recognition capabilities. 
-
-CORE EXPERTISE:
-- Intelligent column mapping beyond simple keyword matching
-- Complex data pattern recognition across varied supplier formats
-- Robust handling of messy, inconsistent spreadsheet layouts
-- Advanced dimension parsing (combined strings, separate columns, mixed units)
-- Multi-language product description analysis
-- Currency and measurement unit standardization
-
-ANALYSIS APPROACH:
-1. DEEP PATTERN ANALYSIS: Look for data consistency patterns, not just keywords
-2. CONTEXTUAL REASONING: Use surrounding data to infer column purposes
-3. INTELLIGENT FALLBACKS: When primary mapping fails, use secondary indicators
-4. VALIDATION: Cross-reference extracted data for logical consistency
+      // A mapping confirmed after a preview (its token, or the mapping as the user left it)
+      // comes per sheet in sheetMappings, or top-level for a single sheet
+      const confirmedFor = (sheetData) => (sheetMappings && sheetMappings[sheetData.sheetName]) ||
+        (sheets.length === 1 && (mappingToken || mapping) ? { mappingToken, mapping, headerRow } : null);
 
-OUTPUT REQUIREMENTS:
-- Return ONLY valid JSON with exact field structure
-- Ensure all required mapping fields are present
-- Use null for unmapped fields, never omit them
-- Include confidence indicators in your reasoning process`
-          }]
+      // Get Access Token via Firebase Admin, only when some sheet still needs the model
+      let accessToken = null;
+      const getAccessToken = async () => {
+        if (!accessToken) {
+          accessToken = admin.credential.applicationDefault().getAccessToken().then(token => token.access_token);
         }
+        return accessToken;
       };
 
-      const aiResponse = await fetch(apiEndpoint, {
-        method: "POST",
-        headers: {
-          "Authorization": `Bearer ${accessToken}`,
-          "Content-Type": "application/json"
-        },
-        body: JSON.stringify(requestBody)
-      });
+      // A sheet without a confirmed mapping is looked up by layout before asking the model.
+      // Only the model's own mappings are cached: this endpoint is public, so a mapping sent
+      // in by a caller is used for their request but never served to anyone else.
+      // refreshMapping drops the layout's cached mappings and asks the model again.
+      const cacheUse = { hits: 0, savedMs: 0 };
+      const mapSheet = async (sheetData) => {
+        const candidates = templateCandidates(sheetData.data);
+        if (refreshMapping) {
+          await mappingCache.forget(candidates);
+        } else {
+          const hit = await mappingCache.match(candidates);
+          if (hit) {
+            cacheUse.hits++;
+            cacheUse.savedMs += hit.savedMs;
+            const { mapping, headerRow, confidence, notes } = hit.entry;
+            return { aiMapping: { mapping, headerRow, confidence, notes }, source: "cache" };
+          }
+        }
+        const started = Date.now();
+        const aiMapping = await analyzeSheetMapping(sheetData, await getAccessToken());
+        const templateRow = aiMapping.headerRow > 20 ? 0 : aiMapping.headerRow;
+        const key = templateFingerprint(sheetData.data, templateRow);
+        if (key) {
+          await mappingCache.put(key, {
+            mapping: aiMapping.mapping,
+            headerRow: templateRow,
+            confidence: aiMapping.confidence ?? null,
+            notes: aiMapping.notes ?? null,
+            modelMs: Date.now() - started,
+            source: "model"
+          });
+        }
+        return { aiMapping, source: "model" };
+      };
 
-      if (!aiResponse.ok) {
-        const errorText = await aiResponse.text();
-        throw new Error(`Vertex AI REST Error ${aiResponse.status}: ${errorText}`);
+      // Streamed extraction (stream: true) answers in NDJSON, one JSON object per line:
+      //   { type: "start", sheets }                   names of the sheets being mapped
+      //   { type: "mapping", sheet, mapping, ... }    as soon as a sheet is mapped
+      //   { type: "products", sheet, products }       PRODUCT_BATCH_SIZE at a time
+      //   { type: "sheetError", sheet, error }        a sheet left out (drop its products)
+      //   { type: "stats", products, sheets, ... }    trailer, or { type: "error", error }
+      // Batches are written as extractProductBatches builds them, waiting on the socket
+      // when it's backed up, so nothing sheet-sized is held or serialized in one piece.
+      let writeLine = null;
+      if (stream && !preview) {
+        res.status(200).set({
+          "Content-Type": "application/x-ndjson; charset=utf-8",
+          "Cache-Control": "no-cache",
+          "X-Accel-Buffering": "no"
+        });
+        writeLine = (line) => (res.write(JSON.stringify(line) + "\n") ? Promise.resolve() : new Promise(resolve => res.once("drain", resolve)));
+        await writeLine({ type: "start", sheets: sheets.map(s => s.sheetName) });
       }
 
-      const responseJson = await aiResponse.json();
-
-      // SAFETY CHECK: Ensure we have content
-      if (!responseJson.candidates || responseJson.candidates.length === 0 || !responseJson.candidates[0].content || !responseJson.candidates[0].content.parts || responseJson.candidates[0].content.parts.length === 0) {
-        console.error("AI returned empty response or was blocked:", JSON.stringify(responseJson));
-        throw new Error("AI service returned an empty response. This might be due to safety filters.");
+      // 2. Map (and unless previewing, extract) each product sheet, a few at a time. With
+      // several sheets one that fails is left out; a single sheet's failure is the request's
+      const failures = [];
+      const results = (await runLimited(sheets, SHEET_CONCURRENCY, async (sheetData) => {
+        const name = sheetData.sheetName;
+        try {
+          const { aiMapping, source: mappingSource } =
+            (preview ? null : confirmedMapping(sheetData, confirmedFor(sheetData))) || await mapSheet(sheetData);
+          if (preview) {
+            return { sheetData, aiMapping, mappingSource, mappingToken: issueMappingToken(sheetData, aiMapping), products: [], productCount: 0 };
+          }
+          // A corrected mapping means the cached one for this layout (if any) was wrong
+          if (mappingSource === "client") await mappingCache.forget(templateCandidates(sheetData.data));
+
+          // FAILSAFE: Clamp headerRow to reasonable start
+          const safeHeaderRow = (aiMapping.headerRow > 20) ? 0 : aiMapping.headerRow;
+          const batches = extractProductBatches(sheetData, aiMapping.mapping, safeHeaderRow, extractedImages[name] || []);
+          const tag = (product) => ({ ...product, sheet: name });
+          const products = [];
+          let productCount = 0;
+          if (writeLine) {
+            const { mapping, headerRow, confidence, notes } = aiMapping;
+            await writeLine({ type: "mapping", sheet: name, mapping, headerRow, confidence, notes, mappingSource });
+            for (const batch of batches) {
+              productCount += batch.length;
+              await writeLine({ type: "products", sheet: name, products: batch.map(tag) });
+            }
+          } else {
+            for (const batch of batches) for (const product of batch) products.push(tag(product));
+            productCount = products.length;
+          }
+          console.log(`Extracted ${productCount} products from "${name}" (mapping: ${mappingSource})`);
+          return { sheetData, aiMapping, mappingSource, products, productCount };
+        } catch (sheetError) {
+          if (sheets.length === 1) throw sheetError;
+          console.warn(`⚠️  Sheet "${name}" failed:`, sheetError.message);
+          failures.push({ name, error: sheetError.message });
+          if (writeLine) await writeLine({ type: "sheetError", sheet: name, error: sheetError.message });
+          return null;
+        }
+      })).filter(Boolean);
+      if (!results.length) {
+        throw new Error(`No sheet could be analyzed: ${failures.map(f => `${f.name} (${f.error})`).join("; ")}`);
       }
 
-      const responseText = responseJson.candidates[0].content.parts[0].text;
-      console.log("AI Response received (length: " + responseText.length + ")");
-
-      // 3. Parse AI response
-      const aiMapping = parseAIResponse(responseText);
-      
-      // 3.5. Normalize mapping to ensure all fields exist
-      aiMapping.mapping = normalizeMapping(aiMapping.mapping);
-      console.log("Normalized Mapping:", JSON.stringify(aiMapping.mapping));
-
-      // 4. If preview mode, just return the mapping for user confirmation
+      const { sheetData, aiMapping } = results[0];
+      const sheetSummary = results.map(r => ({
+        name: r.sheetData.sheetName,
+        rows: r.sheetData.rowCount,
+        cols: r.sheetData.colCount,
+        headerRow: r.aiMapping.headerRow,
+        mapping: r.aiMapping.mapping,
+        confidence: r.aiMapping.confidence,
+        mappingSource: r.mappingSource,
+        mappingToken: r.mappingToken,
+        products: r.productCount
+      }));
+      const cacheSummary = { ...mappingCache.summary(), requestHits: cacheUse.hits, requestSavedMs: cacheUse.savedMs };
+
+      // 3. If preview mode, just return the mappings for user confirmation (the first sheet's
+      // at the top level, as for single-sheet workbooks)
       if (preview) {
         res.json({
           success: true,
@@ -784,16 +826,35 @@ OUTPUT REQUIREMENTS:
           headerRow: aiMapping.headerRow,
           confidence: aiMapping.confidence,
           notes: aiMapping.notes,
-          sampleData: sheetData.data.slice(0, 5)
+          mappingToken: results[0].mappingToken,
+          mappingSource: results[0].mappingSource,
+          sampleData: sheetData.data.slice(0, 5),
+          sheets: sheetSummary,
+          failedSheets: failures,
+          mappingCache: cacheSummary
+        });
+        return;
+      }
+
+      // 4. Streamed: the trailer closes the response
+      if (writeLine) {
+        const total = results.reduce((n, r) => n + r.productCount, 0);
+        console.log(`Streamed ${total} products from ${results.length} sheet(s)`);
+        await writeLine({
+          type: "stats",
+          products: total,
+          sheets: sheetSummary,
+          failedSheets: failures,
+          mappingCache: cacheSummary,
+          ms: Date.now() - started
         });
+        res.end();
         return;
       }
 
-      // 5. Extract products based on mapping
-      // FAILSAFE: Clamp headerRow to reasonable start
-      const safeHeaderRow = (aiMapping.headerRow > 20) ? 0 : aiMapping.headerRow;
-      const products = extractProducts(sheetData, aiMapping.mapping, safeHeaderRow, extractedImages);
-      console.log(`Extracted ${products.length} products`);
+      // Products of every sheet, merged in workbook order and tagged with their sheet
+      const products = results.flatMap(r => r.products);
+      console.log(`Extracted ${products.length} products from ${results.length} sheet(s)`);
 
       res.json({
         success: true,
@@ -801,6 +862,10 @@ OUTPUT REQUIREMENTS:
         products,
         mapping: aiMapping.mapping,
         confidence: aiMapping.confidence,
+        mappingSource: results[0].mappingSource,
+        sheets: sheetSummary,
+        failedSheets: failures,
+        mappingCache: cacheSummary,
         originalData: {
           sheetName: sheetData.sheetName,
           headers: sheetData.headers,
@@ -815,6 +880,12 @@ OUTPUT REQUIREMENTS:
       console.error("Error stack:", error.stack);
       console.error("Error name:", error.name);
       console.error("=== END ERROR ===");
+
+      // A streamed response has already sent its status; the error goes in as its last line
+      if (res.headersSent) {
+        res.end(JSON.stringify({ type: "error", error: error.message }) + "\n");
+        return;
+      }
       
       res.status(500).json({
         error: error.message,
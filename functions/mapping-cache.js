@@ -0,0 +1,277 @@
+/**
+ * Column mapping cache for analyzeQuoteSheetV2
+ *
+ * A supplier sends every quote on the same template, so a sheet whose layout has been mapped
+ * before doesn't need the model again. Entries are keyed by templateFingerprint (the header
+ * text plus the column-type profile of the rows under it, see lib/quote-extract.js) and hold
+ * the normalized mapping, headerRow, confidence and notes, plus how long the model took to
+ * produce them so a hit can report the latency it saved.
+ *
+ * Backends share one small interface - get(key), put(entry), delete(key) - and are layered
+ * by MappingCache: a per-instance in-memory LRU in front of a durable store (Firestore in
+ * production, a JSON file under the emulator or in test scripts). Entries expire after a TTL
+ * and each store evicts its least recently used entries past its limit. A request can drop a
+ * layout's entries to have the model map it afresh (MappingCache.forget); memory copies
+ * live only a few minutes, so other warm instances stop serving a dropped entry soon after.
+ */
+
+const fs = require("fs");
+const os = require("os");
+const path = require("path");
+
+const MAPPING_CACHE_TTL_MS = 30 * 24 * 60 * 60 * 1000;
+const MAPPING_CACHE_MEMORY_TTL_MS = 5 * 60 * 1000;
+const MAPPING_CACHE_MEMORY_LIMIT = 500;
+const MAPPING_CACHE_DURABLE_LIMIT = 5000;
+const MAPPING_CACHE_COLLECTION = "mappingCache";
+
+const isLive = (entry, now) => entry && entry.expiresAt > now;
+
+/**
+ * Per-instance LRU: a Map in recency order (oldest first)
+ */
+class MemoryMappingStore {
+  constructor({ limit = MAPPING_CACHE_MEMORY_LIMIT } = {}) {
+    this.name = "memory";
+    this.limit = limit;
+    this.entries = new Map();
+  }
+
+  async get(key) {
+    const entry = this.entries.get(key);
+    if (!entry) return null;
+    this.entries.delete(key);
+    if (!isLive(entry, Date.now())) return null;
+    this.entries.set(key, entry);
+    return entry;
+  }
+
+  async put(entry) {
+    this.entries.delete(entry.key);
+    this.entries.set(entry.key, entry);
+    while (this.entries.size > this.limit) this.entries.delete(this.entries.keys().next().value);
+  }
+
+  async delete(key) {
+    this.entries.delete(key);
+  }
+}
+
+/**
+ * JSON file stand-in for Firestore (emulator runs and test scripts). The whole file is
+ * read and rewritten per change, which is fine at test sizes.
+ */
+class FileMappingStore {
+  constructor({ file = path.join(os.tmpdir(), "landed-mapping-cache.json"), limit = MAPPING_CACHE_DURABLE_LIMIT } = {}) {
+    this.name = "file";
+    this.file = file;
+    this.limit = limit;
+  }
+
+  _read() {
+    try {
+      return JSON.parse(fs.readFileSync(this.file, "utf8"));
+    } catch (err) {
+      return {};
+    }
+  }
+
+  _write(entries) {
+    fs.writeFileSync(this.file, JSON.stringify(entries));
+  }
+
+  async get(key) {
+    const entries = this._read();
+    const entry = entries[key];
+    if (!entry) return null;
+    if (!isLive(entry, Date.now())) {
+      delete entries[key];
+      this._write(entries);
+      return null;
+    }
+    entry.lastUsed = Date.now();
+    this._write(entries);
+    return entry;
+  }
+
+  async put(entry) {
+    const entries = this._read();
+    entries[entry.key] = { ...entry, lastUsed: Date.now() };
+    const keys = Object.keys(entries);
+    if (keys.length > this.limit) {
+      keys.sort((a, b) => entries[a].lastUsed - entries[b].lastUsed)
+        .slice(0, keys.length - this.limit)
+        .forEach(k => { delete entries[k]; });
+    }
+    this._write(entries);
+  }
+
+  async delete(key) {
+    const entries = this._read();
+    delete entries[key];
+    this._write(entries);
+  }
+}
+
+/**
+ * Firestore collection shared by all instances, one document per fingerprint. Expired
+ * documents are skipped on read (a Firestore TTL policy on expiresAt can delete them);
+ * every pruneEvery puts, documents past the limit are removed, least recently used first.
+ */
+class FirestoreMappingStore {
+  constructor({ db, collection = MAPPING_CACHE_COLLECTION, limit = MAPPING_CACHE_DURABLE_LIMIT, pruneEvery = 50 } = {}) {
+    this.name = "firestore";
+    this.collection = db.collection(collection);
+    this.limit = limit;
+    this.pruneEvery = pruneEvery;
+    this.puts = 0;
+  }
+
+  async get(key) {
+    const doc = await this.collection.doc(key).get();
+    if (!doc.exists) return null;
+    const entry = doc.data();
+    if (!isLive(entry, Date.now())) return null;
+    doc.ref.update({ lastUsed: Date.now() }).catch(err => console.warn("Mapping cache touch failed:", err.message));
+    return entry;
+  }
+
+  async put(entry) {
+    await this.collection.doc(entry.key).set({ ...entry, lastUsed: Date.now() });
+    if (++this.puts % this.pruneEvery === 0) {
+      const stale = await this.collection.orderBy("lastUsed", "desc").offset(this.limit).limit(100).get();
+      await Promise.all(stale.docs.map(doc => doc.ref.delete()));
+    }
+  }
+
+  async delete(key) {
+    await this.collection.doc(key).delete();
+  }
+}
+
+/**
+ * Memory in front of an optional durable store. Durable-store failures are logged and
+ * treated as misses, so the cache can only make a request faster, never fail it.
+ * Keeps per-instance lookup/hit counts and the model time hits have saved.
+ */
+class MappingCache {
+  constructor({ memory = new MemoryMappingStore(), durable = null, ttlMs = MAPPING_CACHE_TTL_MS, memoryTtlMs = MAPPING_CACHE_MEMORY_TTL_MS } = {}) {
+    this.memory = memory;
+    this.durable = durable;
+    this.ttlMs = ttlMs;
+    this.memoryTtlMs = memoryTtlMs;
+    this.stats = { lookups: 0, hits: 0, savedMs: 0 };
+  }
+
+  /**
+   * First live entry among candidates ([{ headerRow, key }], see templateCandidates) whose
+   * header row is the candidate's. Returns { entry, tier, savedMs } or null.
+   */
+  async match(candidates) {
+    const started = Date.now();
+    this.stats.lookups++;
+    for (const candidate of candidates) {
+      let tier = this.memory.name;
+      let entry = await this.memory.get(candidate.key);
+      if (!entry && this.durable) {
+        try {
+          entry = await this.durable.get(candidate.key);
+          tier = this.durable.name;
+          if (entry) await this.memory.put(this._local(entry));
+        } catch (err) {
+          console.warn(`Mapping cache (${this.durable.name}) read failed:`, err.message);
+        }
+      }
+      if (entry && entry.headerRow === candidate.headerRow) {
+        const savedMs = Math.max(0, (entry.modelMs || 0) - (Date.now() - started));
+        this.stats.hits++;
+        this.stats.savedMs += savedMs;
+        return { entry, tier, savedMs };
+      }
+    }
+    return null;
+  }
+
+  /**
+   * Remember a mapping under key: { mapping, headerRow, confidence, notes, modelMs, source }
+   */
+  async put(key, value) {
+    const now = Date.now();
+    const entry = { ...value, key, createdAt: now, expiresAt: now + this.ttlMs };
+    await this.memory.put(this._local(entry));
+    if (!this.durable) return;
+    try {
+      await this.durable.put(entry);
+    } catch (err) {
+      console.warn(`Mapping cache (${this.durable.name}) write failed:`, err.message);
+    }
+  }
+
+  /**
+   * The memory tier's copy: with a durable store behind it, it expires after memoryTtlMs so
+   * a delete on another instance reaches this one (alone, memory is the only copy)
+   */
+  _local(entry) {
+    if (!this.durable) return entry;
+    return { ...entry, expiresAt: Math.min(entry.expiresAt, Date.now() + this.memoryTtlMs) };
+  }
+
+  async delete(key) {
+    await this.memory.delete(key);
+    if (!this.durable) return;
+    try {
+      await this.durable.delete(key);
+    } catch (err) {
+      console.warn(`Mapping cache (${this.durable.name}) delete failed:`, err.message);
+    }
+  }
+
+  /**
+   * Drop every entry a sheet could match (its templateCandidates), so a mapping found to
+   * be wrong is not served again whatever header row it was stored under
+   */
+  async forget(candidates) {
+    await Promise.all(candidates.map(candidate => this.delete(candidate.key)));
+  }
+
+  /**
+   * Per-instance figures for response metadata
+   */
+  summary() {
+    const { lookups, hits, savedMs } = this.stats;
+    return {
+      backend: this.durable ? `memory+${this.durable.name}` : "memory",
+      lookups,
+      hits,
+      hitRate: lookups ? Number((hits / lookups).toFixed(3)) : 0,
+      savedMs
+    };
+  }
+}
+
+/**
+ * The cache for this environment. MAPPING_CACHE_BACKEND picks the durable store:
+ * "firestore", "file" (MAPPING_CACHE_FILE, default a file in the temp directory) or
+ * "memory" (none). Unset, the emulator gets the file store and deployed functions Firestore.
+ */
+function createMappingCache({ getFirestore } = {}) {
+  const backend = process.env.MAPPING_CACHE_BACKEND ||
+    (process.env.FUNCTIONS_EMULATOR === "true" ? "file" : "firestore");
+  let durable = null;
+  if (backend === "file") {
+    durable = new FileMappingStore(process.env.MAPPING_CACHE_FILE ? { file: process.env.MAPPING_CACHE_FILE } : {});
+  } else if (backend === "firestore" && getFirestore) {
+    durable = new FirestoreMappingStore({ db: getFirestore() });
+  }
+  return new MappingCache({ durable });
+}
+
+module.exports = {
+  MAPPING_CACHE_TTL_MS,
+  MAPPING_CACHE_MEMORY_TTL_MS,
+  MemoryMappingStore,
+  FileMappingStore,
+  FirestoreMappingStore,
+  MappingCache,
+  createMappingCache
+};
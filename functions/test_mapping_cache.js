@@ -0,0 +1,72 @@
+/**
+ * Mapping cache check against the file store (no Firestore or model needed):
+ *   node test_mapping_cache.js
+ * Run `npm run sync-shared` first so ./shared/quote-extract.js exists.
+ */
+const fs = require("fs");
+const os = require("os");
+const path = require("path");
+const { MappingCache, MemoryMappingStore, FileMappingStore } = require("./mapping-cache");
+const { templateCandidates, templateFingerprint } = require("./shared/quote-extract");
+
+const check = (label, ok) => {
+  console.log(`${ok ? "PASS" : "FAIL"} ${label}`);
+  if (!ok) process.exitCode = 1;
+};
+
+async function testMappingCache() {
+  const file = path.join(os.tmpdir(), `mapping-cache-test-${process.pid}.json`);
+  const quote = (prices) => [
+    ["Supplier Quote", "", ""],
+    ["Item No", "Carton Size", "Unit Price"],
+    ...prices.map((p, i) => [`WD-00${i}`, "56x50x127cm", `$${p}`])
+  ];
+  const mapping = { sku: { col: 0 }, cartonLength: { col: 1 }, price: { col: 2 } };
+
+  const cache = new MappingCache({ durable: new FileMappingStore({ file }) });
+  check("empty cache misses", !(await cache.match(templateCandidates(quote([89.67, 71.43])))));
+  await cache.put(templateFingerprint(quote([89.67, 71.43]), 1), { mapping, headerRow: 1, confidence: 0.9, modelMs: 4000 });
+
+  const hit = await cache.match(templateCandidates(quote([12, 13, 14])));
+  check("same layout, other values hits", hit && hit.entry.headerRow === 1 && hit.tier === "memory");
+  check("hit reports saved model time", hit && hit.savedMs > 3000);
+
+  // A cold instance: new memory tier, same file
+  const cold = new MappingCache({ durable: new FileMappingStore({ file }) });
+  const durableHit = await cold.match(templateCandidates(quote([5])));
+  check("cold instance hits the durable store", durableHit && durableHit.tier === "file");
+  check("durable hit is promoted to memory", !!(await cold.memory.get(durableHit.entry.key)));
+
+  const other = quote([1]).map(r => [...r, "extra"]);
+  check("different layout misses", !(await cold.match(templateCandidates(other))));
+  check("hit rate is reported", cold.summary().hitRate === 0.5);
+
+  const expired = new MappingCache({ ttlMs: -1 });
+  await expired.put(templateFingerprint(quote([1]), 1), { mapping, headerRow: 1 });
+  check("expired entries miss", !(await expired.match(templateCandidates(quote([1])))));
+
+  // forget drops whatever the layout's candidates were stored under
+  await cold.put(templateFingerprint(quote([7]), 0), { mapping, headerRow: 0 });
+  await cold.forget(templateCandidates(quote([7])));
+  const refreshed = new MappingCache({ durable: new FileMappingStore({ file }) });
+  check("forget misses in memory and the durable store",
+    !(await cold.match(templateCandidates(quote([7])))) && !(await refreshed.match(templateCandidates(quote([7])))));
+
+  // Another warm instance drops its memory copy of a forgotten entry once that copy expires
+  await cold.put(templateFingerprint(quote([7]), 1), { mapping, headerRow: 1 });
+  const warm = new MappingCache({ durable: new FileMappingStore({ file }), memoryTtlMs: 50 });
+  await warm.match(templateCandidates(quote([7])));
+  await cold.forget(templateCandidates(quote([7])));
+  await new Promise(resolve => setTimeout(resolve, 80));
+  check("other instances stop serving a forgotten entry", !(await warm.match(templateCandidates(quote([7])))));
+
+  const lru = new MemoryMappingStore({ limit: 2 });
+  for (const key of ["a", "b"]) await lru.put({ key, expiresAt: Date.now() + 1000 });
+  await lru.get("a");
+  await lru.put({ key: "c", expiresAt: Date.now() + 1000 });
+  check("least recently used entry is evicted", !(await lru.get("b")) && !!(await lru.get("a")));
+
+  fs.rmSync(file, { force: true });
+}
+
+testMappingCache();
@@ -0,0 +1,269 @@
+// Column-level type inference for pasted tables. Each column is profiled once over a sample
+// of its cells (numeric and integer ratio, magnitude, dimension-string hit rate, uniqueness,
+// code/text shape), roles are assigned to whole columns with a confidence, and the chosen
+// columns are then converted in one typed pass each. Deciding per column rather than per cell
+// means an odd cell stays an odd cell instead of shifting the rest of its row.
+
+// lib/dims.js is loaded ahead of this file in the page; under node it's required.
+const profileDims = typeof module !== 'undefined' && module.exports ? require('./dims.js') : self;
+
+const PASTE_SAMPLE_ROWS = 256;
+const PASTE_MIN_CONFIDENCE = 0.5;
+
+// Header words that settle a column's role outright.
+const PASTE_HEADER_ROLES = [
+    ['dims', /dimension|\bsize\b|meas|l\s*[x*×]\s*w|\bdims?\b/],
+    ['pack', /pack|qty|quantity|pcs|units/],
+    ['price', /price|cost|usd|fob|\$|unit/],
+    ['weight', /weight|\bkg\b|\bwt\b|\bg\.?w\b/],
+    ['sku', /sku|item|code|\bref\b|model|\bart\b/],
+    ['title', /title|desc|name|product/],
+    ['L', /^l\b|length/],
+    ['W', /^w\b|width/],
+    ['H', /^h\b|height/]
+];
+
+// Leading number of a cell, by char codes: currency signs, "USD" and spaces before it are
+// skipped, a comma followed by three digits is a thousands separator, anything else ends the
+// number ("12.30, 2" is 12.3). NaN when the cell doesn't start with a number.
+function pasteNumber(s) {
+    const n = s.length;
+    let i = s.startsWith('USD') ? 3 : 0;
+    while (i < n) {
+        const c = s.charCodeAt(i);
+        if ((c >= 48 && c <= 57) || c === 46 || c === 45) break;
+        if (c !== 32 && c !== 36 && c !== 163 && c !== 8364 && c !== 165) return NaN; // $ £ € ¥
+        i++;
+    }
+    let neg = false;
+    if (s.charCodeAt(i) === 45) { neg = true; i++; }
+    let v = 0, scale = 0, digits = 0;
+    for (; i < n; i++) {
+        const c = s.charCodeAt(i);
+        if (c >= 48 && c <= 57) {
+            v = v * 10 + (c - 48);
+            if (scale) scale *= 10;
+            digits++;
+        } else if (c === 46 && !scale) {
+            scale = 1;
+        } else if (c === 44 && !scale && digits && isDigitRun(s, i + 1, 3)) {
+            continue;
+        } else break;
+    }
+    if (!digits) return NaN;
+    if (scale) v /= scale;
+    return neg ? -v : v;
+}
+
+const isDigitRun = (s, start, len) => {
+    for (let k = start; k < start + len; k++) {
+        const c = s.charCodeAt(k);
+        if (!(c >= 48 && c <= 57)) return false;
+    }
+    const next = s.charCodeAt(start + len);
+    return !(next >= 48 && next <= 57);
+};
+
+const PASTE_CODE = /^[A-Za-z0-9][A-Za-z0-9\-_./#]{1,31}$/;
+
+// Profile of column c over the sampled rows: ratios are of the non-empty cells.
+function profileColumn(rows, c, sample) {
+    const out = { a: 0, b: 0, c: 0, unit: '' };
+    const seen = new Set();
+    const nums = [];
+    let filled = 0, numeric = 0, integer = 0, dims = 0, codes = 0, words = 0, textLen = 0;
+    for (const r of sample) {
+        const v = rows[r][c];
+        if (v == null || v === '') continue;
+        const s = String(v);
+        filled++;
+        seen.add(s);
+        textLen += s.length;
+        const startsWithDigit = s.charCodeAt(0) >= 48 && s.charCodeAt(0) <= 57;
+        if ((startsWithDigit || /^[lL]\s*\d/.test(s)) && profileDims.tokenizeDims(s, out) >= 3) { dims++; continue; }
+        const x = pasteNumber(s);
+        if (!Number.isNaN(x) && /^[^A-Za-z]*[A-Za-z]{0,4}[^A-Za-z]*$/.test(s)) {
+            numeric++;
+            nums.push(x);
+            if (Number.isInteger(x)) integer++;
+        } else if (PASTE_CODE.test(s) && /\d/.test(s)) codes++;
+        else if (s.indexOf(' ') > 0) words++;
+        else codes += 0.5;
+    }
+    nums.sort((a, b) => a - b);
+    const f = filled || 1;
+    return {
+        col: c,
+        filled: filled / (sample.length || 1),
+        numeric: numeric / f,
+        integer: numeric ? integer / numeric : 0,
+        dims: dims / f,
+        code: codes / f,
+        text: words / f,
+        unique: seen.size / f,
+        avgLength: textLen / f,
+        min: nums.length ? nums[0] : 0,
+        max: nums.length ? nums[nums.length - 1] : 0,
+        median: nums.length ? nums[nums.length >> 1] : 0
+    };
+}
+
+// Evenly spaced row indices, at most count of them.
+const pasteSample = (n, start, count) => {
+    const rows = n - start;
+    if (rows <= count) return Array.from({ length: rows }, (_, k) => start + k);
+    return Array.from({ length: count }, (_, k) => start + Math.floor(k * rows / count));
+};
+
+// rows: [[cell, ...]] -> { header: bool, profiles: [profile per column] }. The first row is
+// taken as a header when most of the columns that are numeric below it hold text in it.
+function profileColumns(rows, sampleRows = PASTE_SAMPLE_ROWS) {
+    const width = rows.reduce((n, r) => Math.max(n, r.length), 0);
+    const body = pasteSample(rows.length, rows.length > 1 ? 1 : 0, sampleRows);
+    const profiles = [];
+    for (let c = 0; c < width; c++) profiles.push(profileColumn(rows, c, body));
+    let typed = 0, labelled = 0;
+    if (rows.length > 1) {
+        profiles.forEach((p, c) => {
+            if (p.numeric + p.dims < 0.6) return;
+            typed++;
+            const h = String(rows[0][c] ?? '').trim();
+            if (h && Number.isNaN(pasteNumber(h)) && !(profileDims.tokenizeDims(h, { a: 0, b: 0, c: 0, unit: '' }) >= 3)) labelled++;
+        });
+    }
+    const header = typed > 0 && labelled * 2 > typed;
+    if (!header) {
+        // the first row is data after all: profile it in
+        const all = pasteSample(rows.length, 0, sampleRows);
+        for (let c = 0; c < width; c++) profiles[c] = profileColumn(rows, c, all);
+    }
+    return { header, profiles };
+}
+
+// How well a profile fits each role, 0..1.
+const PASTE_ROLE_SCORES = {
+    dims: (p) => p.dims,
+    price: (p) => p.numeric * (p.median > 0 && p.max < 100000 ? 1 : 0) * (0.7 + 0.3 * (1 - p.integer)) * (p.unique > 0.05 ? 1 : 0.6),
+    pack: (p) => p.numeric * p.integer * (p.min >= 1 && p.max <= 1000 ? 1 : 0) * (p.unique < 0.5 ? 1 : 0.75),
+    weight: (p) => p.numeric * (p.min > 0 && p.max <= 1000 ? 0.8 : 0) * (0.6 + 0.4 * (1 - p.integer)),
+    sku: (p) => (p.code + p.numeric * p.integer * 0.5 * (p.min >= 1000 ? 1 : 0)) * (0.5 + 0.5 * p.unique),
+    title: (p) => p.text * (p.avgLength > 8 ? 1 : 0.5),
+    L: () => 0, W: () => 0, H: () => 0
+};
+
+// Role per column: { roles: { role: { col, confidence } }, header }. Header names decide
+// first; the remaining columns go to the remaining roles best score first, left to right on
+// ties (so of two price-like columns the first is the price, as suppliers lay them out). A
+// run of three numeric columns becomes L/W/H when no column holds dimension strings. Whole-
+// number prices look like pack sizes, so while no price is assigned, the first column that
+// could still be the price is given price rather than pack.
+function assignColumnRoles(rows, { sampleRows } = {}) {
+    const { header, profiles } = profileColumns(rows, sampleRows);
+    const roles = {};
+    const taken = new Set();
+    const give = (role, col, confidence) => {
+        roles[role] = { col, confidence: Math.max(0, Math.min(1, confidence)) };
+        taken.add(col);
+    };
+
+    if (header) {
+        profiles.forEach((p, c) => {
+            const h = String(rows[0][c] ?? '').trim().toLowerCase();
+            const hit = h && PASTE_HEADER_ROLES.find(([role, re]) => !roles[role] && re.test(h));
+            if (!hit || taken.has(c)) return;
+            const [role] = hit;
+            const typed = role === 'L' || role === 'W' || role === 'H' ? p.numeric : PASTE_ROLE_SCORES[role](p);
+            give(role, c, 0.5 + 0.5 * typed);
+        });
+    }
+
+    const candidates = [];
+    for (const role of ['dims', 'price', 'pack', 'sku', 'title', 'weight']) {
+        if (roles[role]) continue;
+        profiles.forEach((p, c) => {
+            if (p.filled < 0.2) return;
+            const score = PASTE_ROLE_SCORES[role](p);
+            if (score >= PASTE_MIN_CONFIDENCE) candidates.push({ role, col: c, score });
+        });
+    }
+    candidates.sort((a, b) => b.score - a.score || a.col - b.col);
+    // Before the price, a run of three numeric columns sized like cm/mm is L/W/H. Prices have
+    // decimals where dimensions rarely do, so the run with the most whole-number columns wins.
+    if (!roles.dims && !roles.L) {
+        let best = -1, bestWhole = 1;
+        for (let c = 0; c + 2 < profiles.length; c++) {
+            const run = [c, c + 1, c + 2].map(k => profiles[k]);
+            if (run.some((p, k) => taken.has(c + k) || p.numeric < 0.8 || p.min <= 0 || p.max > 5000)) continue;
+            const whole = run.filter(p => p.integer > 0.8).length;
+            if (whole > bestWhole) { best = c; bestWhole = whole; }
+        }
+        if (best >= 0) {
+            const confidence = Math.min(...[0, 1, 2].map(k => profiles[best + k].numeric)) * (bestWhole === 3 ? 0.9 : 0.7);
+            ['L', 'W', 'H'].forEach((role, k) => give(role, best + k, confidence));
+        }
+    }
+    const priceCandidates = candidates.filter(k => k.role === 'price').sort((a, b) => a.col - b.col);
+    for (const { role, col, score } of candidates) {
+        if (roles[role] || taken.has(col)) continue;
+        if (role === 'weight' && !header) continue; // unlabelled, a weight is indistinguishable from a price
+        if (role === 'pack' && !roles.price) {
+            const price = priceCandidates.find(k => !taken.has(k.col));
+            if (price && price.col === col) {
+                give('price', col, price.score);
+                continue;
+            }
+        }
+        give(role, col, score);
+    }
+    return { header, roles, profiles };
+}
+
+// Whole-column conversion: { count, fields } where fields maps bulk-store fields to typed
+// columns (Float64Array for numbers, string arrays for text) for the roles given. Dimension
+// strings go through parseDimsColumn, so their unit is inferred per column and the values are
+// in cm; separate L/W/H columns share one inferred unit.
+function convertColumns(rows, roles, header) {
+    const start = header ? 1 : 0;
+    const count = Math.max(0, rows.length - start);
+    const cells = (col) => {
+        const out = new Array(count);
+        for (let i = 0; i < count; i++) {
+            const v = rows[start + i][col];
+            out[i] = v == null ? '' : String(v);
+        }
+        return out;
+    };
+    const numbers = (col, fallback) => {
+        const out = new Float64Array(count);
+        for (let i = 0; i < count; i++) {
+            const v = rows[start + i][col];
+            const x = v == null || v === '' ? NaN : pasteNumber(String(v));
+            out[i] = Number.isNaN(x) ? fallback : x;
+        }
+        return out;
+    };
+    const fields = {};
+    if (roles.price) fields.unitUSD = numbers(roles.price.col, 0);
+    if (roles.pack) {
+        const pack = numbers(roles.pack.col, 1);
+        for (let i = 0; i < count; i++) pack[i] = Math.max(1, Math.round(pack[i]));
+        fields.pack = pack;
+    }
+    if (roles.weight) fields.weight = numbers(roles.weight.col, 0);
+    if (roles.sku) fields.sku = cells(roles.sku.col);
+    if (roles.title) fields.title = cells(roles.title.col);
+    if (roles.dims) {
+        const dims = profileDims.parseDimsColumn(cells(roles.dims.col), { hint: header ? rows[0][roles.dims.col] : undefined });
+        fields.L = dims.L; fields.W = dims.W; fields.H = dims.H;
+    } else {
+        const sides = ['L', 'W', 'H'].filter(role => roles[role]);
+        const cols = sides.map(role => cells(roles[role].col));
+        const unit = cols.length && profileDims.inferDimsUnitAcross(cols, header ? rows[0][roles[sides[0]].col] : undefined);
+        sides.forEach((role, k) => { fields[role] = profileDims.parseDimsColumn(cols[k], { unit }).L; });
+    }
+    return { count, fields };
+}
+
+if (typeof module !== 'undefined' && module.exports) {
+    module.exports = { pasteNumber, profileColumns, assignColumnRoles, convertColumns };
+}
@@ -0,0 +1,179 @@
+// Streaming RFC 4180 CSV/TSV parser. Text is pushed in arbitrary chunks (a field, quote
+// pair or CRLF may straddle two chunks) and complete rows come out as arrays of strings.
+// Quoted fields may hold delimiters, newlines and "" escapes. Loaded as a classic script by
+// index.html and importScripts()'d by the ingest worker, so it must stay free of DOM.
+
+const CSV_DELIMITERS = [',', '\t', ';', '|'];
+
+const FIELD_START = 0, UNQUOTED = 1, QUOTED = 2, QUOTE_SEEN = 3;
+
+// Pick the delimiter from a text sample: the candidate that appears (outside quotes) the
+// same non-zero number of times on the most lines, more columns breaking ties. Returns
+// fallback when no candidate appears at all.
+function detectDelimiter(sample, fallback = ',') {
+    const lines = [];
+    let counts = null, inQuotes = false;
+    for (let i = 0; i < sample.length && lines.length < 20; i++) {
+        const c = sample[i];
+        if (!counts) counts = CSV_DELIMITERS.map(() => 0);
+        if (c === '"') inQuotes = !inQuotes;
+        else if (!inQuotes && (c === '\n' || c === '\r')) {
+            if (counts.some(Boolean)) lines.push(counts);
+            counts = null;
+            if (c === '\r' && sample[i + 1] === '\n') i++;
+        } else if (!inQuotes) {
+            const k = CSV_DELIMITERS.indexOf(c);
+            if (k >= 0) counts[k]++;
+        }
+    }
+    if (counts && counts.some(Boolean) && !lines.length) lines.push(counts);
+
+    let best = -1, bestScore = 0, bestCols = 0;
+    CSV_DELIMITERS.forEach((_, k) => {
+        const tally = new Map();
+        for (const line of lines) if (line[k]) tally.set(line[k], (tally.get(line[k]) || 0) + 1);
+        for (const [cols, score] of tally) {
+            if (score > bestScore || (score === bestScore && cols > bestCols)) {
+                best = k; bestScore = score; bestCols = cols;
+            }
+        }
+    });
+    return best >= 0 ? CSV_DELIMITERS[best] : fallback;
+}
+
+function CsvStreamParser(delimiter = ',') {
+    this.delim = delimiter.charCodeAt(0);
+    this.state = FIELD_START;
+    this.field = '';
+    this.row = [];
+    this.skipLF = false;
+    this.started = false;
+    this.rowCount = 0;
+}
+
+CsvStreamParser.prototype._endField = function () {
+    this.row.push(this.field);
+    this.field = '';
+};
+
+CsvStreamParser.prototype._endRow = function (out) {
+    this._endField();
+    // blank lines come through as a single empty field
+    if (this.row.length > 1 || this.row[0] !== '') {
+        out.push(this.row);
+        this.rowCount++;
+    }
+    this.row = [];
+};
+
+// Parse the next chunk of text; complete rows are appended to out (and returned).
+CsvStreamParser.prototype.push = function (text, out = []) {
+    if (!this.started && text.length) {
+        this.started = true;
+        if (text.charCodeAt(0) === 0xFEFF) text = text.slice(1);
+    }
+    const d = this.delim, n = text.length;
+    let i = 0, state = this.state;
+    while (i < n) {
+        if (this.skipLF) {
+            this.skipLF = false;
+            if (text.charCodeAt(i) === 10) { i++; continue; }
+        }
+        if (state === QUOTED) {
+            const q = text.indexOf('"', i);
+            if (q < 0) { this.field += text.slice(i); i = n; break; }
+            this.field += text.slice(i, q);
+            i = q + 1;
+            state = QUOTE_SEEN;
+            continue;
+        }
+        const c = text.charCodeAt(i);
+        if (state === QUOTE_SEEN) {
+            if (c === 34) { this.field += '"'; i++; state = QUOTED; continue; }
+            state = UNQUOTED; // closing quote; anything up to the delimiter is kept as-is
+        } else if (state === FIELD_START) {
+            if (c === 34) { i++; state = QUOTED; continue; }
+            state = UNQUOTED;
+        }
+        let j = i;
+        while (j < n) {
+            const cj = text.charCodeAt(j);
+            if (cj === d || cj === 10 || cj === 13) break;
+            j++;
+        }
+        this.field += text.slice(i, j);
+        if (j === n) { i = n; break; }
+        const end = text.charCodeAt(j);
+        if (end === d) this._endField();
+        else {
+            this._endRow(out);
+            if (end === 13) this.skipLF = true;
+        }
+        state = FIELD_START;
+        i = j + 1;
+    }
+    this.state = state;
+    return out;
+};
+
+// Flush the last row when the input doesn't end with a newline.
+CsvStreamParser.prototype.end = function (out = []) {
+    if (this.state !== FIELD_START || this.field || this.row.length) this._endRow(out);
+    this.state = FIELD_START;
+    return out;
+};
+
+// Whole-string convenience: [rows] with the delimiter detected when not given.
+function parseDelimitedText(text, delimiter) {
+    const parser = new CsvStreamParser(delimiter || detectDelimiter(text.slice(0, 64 * 1024)));
+    const rows = parser.push(text);
+    return parser.end(rows);
+}
+
+// Stream a File/Blob through the parser. onRows(rows, progress) is called with every
+// chunkRows rows (and the remainder at the end), progress being { rowsSoFar, loaded, total }
+// in bytes. The delimiter, when not given, is detected from the first 16 KB. Resolves with
+// { rows, delimiter }, or null if isCancelled() turned true between reads.
+async function readDelimitedFile(file, onRows, { delimiter, chunkRows = 5000, isCancelled } = {}) {
+    const reader = file.stream().getReader();
+    const decoder = new TextDecoder();
+    let parser = delimiter ? new CsvStreamParser(delimiter) : null;
+    let pending = [], loaded = 0, head = '';
+
+    const start = () => {
+        delimiter = detectDelimiter(head);
+        parser = new CsvStreamParser(delimiter);
+        parser.push(head, pending);
+        head = '';
+    };
+    const flush = () => {
+        if (!pending.length) return;
+        const rows = pending;
+        pending = [];
+        onRows(rows, { rowsSoFar: parser.rowCount, loaded, total: file.size });
+    };
+
+    for (;;) {
+        const { done, value } = await reader.read();
+        if (isCancelled && isCancelled()) { reader.cancel(); return null; }
+        if (done) break;
+        loaded += value.byteLength;
+        const text = decoder.decode(value, { stream: true });
+        if (parser) parser.push(text, pending);
+        else {
+            // hold back until there's enough text to tell the delimiter from a sample
+            head += text;
+            if (head.length >= 16 * 1024) start();
+        }
+        if (parser && pending.length >= chunkRows) flush();
+    }
+    if (!parser) start();
+    parser.push(decoder.decode(), pending);
+    parser.end(pending);
+    flush();
+    return { rows: parser.rowCount, delimiter };
+}
+
+if (typeof module !== 'undefined' && module.exports) {
+    module.exports = { CSV_DELIMITERS, detectDelimiter, CsvStreamParser, parseDelimitedText, readDelimitedFile };
+}
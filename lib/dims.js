@@ -0,0 +1,196 @@
+// Dimension strings: "60x45x35cm", "600*450*350MM", "L60 W45 H35", "23.6 x 17.7 in",
+// "60×45×35", "0,6 x 0,45 x 0,35 m". One char-code scan per cell with no regexes, substrings
+// or arrays, so a whole sheet column can be tokenized without garbage. Units are resolved per
+// column: a cell that names its unit keeps it, every other cell takes the column's unit,
+// inferred from the units the column does name, a header/mapping hint, and failing those the
+// size of its values (suppliers who write millimetres rarely say so). Loaded as a classic
+// script by index.html and the ingest worker, and copied into functions/shared/ for the
+// Cloud Function by sync_shared.js (firebase.json predeploy), so it must stay free of DOM.
+
+const DIM_UNITS = { mm: 0.1, cm: 1, m: 100, in: 2.54 };
+
+// Column values whose median longest side is above this are millimetres (no carton or
+// product we price is 4 m long).
+const DIM_MM_ABOVE = 400;
+
+// Letters after a number: the unit they name, '' for the L/W/H labels and "x" separators,
+// null for any other word.
+const dimsWordUnit = (s, start, end) => {
+    const n = end - start;
+    const c0 = s.charCodeAt(start) | 32;
+    const c1 = n > 1 ? s.charCodeAt(start + 1) | 32 : 0;
+    if (n === 1) {
+        if (c0 === 109) return 'm';
+        return c0 === 120 || c0 === 108 || c0 === 119 || c0 === 104 || c0 === 100 ? '' : null; // x l w h d
+    }
+    if (n === 2) {
+        if (c1 === 109 && c0 === 109) return 'mm';
+        if (c1 === 109 && c0 === 99) return 'cm';
+        if (c0 === 105 && c1 === 110) return 'in';
+        return null;
+    }
+    const w = s.slice(start, end).toLowerCase();
+    if (w === 'inch' || w === 'inches') return 'in';
+    if (w === 'mtr' || w === 'meter' || w === 'metre' || w === 'meters' || w === 'metres') return 'm';
+    if (w === 'cms') return 'cm';
+    if (w === 'mms') return 'mm';
+    return null;
+};
+
+const isDimsLetter = (c) => (c >= 65 && c <= 90) || (c >= 97 && c <= 122);
+
+const isDimsDigit = (c) => c >= 48 && c <= 57;
+
+// A thousands group at i: three digits and then no fourth.
+const isDimsGroup = (s, i) => isDimsDigit(s.charCodeAt(i)) && isDimsDigit(s.charCodeAt(i + 1)) &&
+    isDimsDigit(s.charCodeAt(i + 2)) && !isDimsDigit(s.charCodeAt(i + 3));
+
+// Tokenize one cell into out = { a, b, c, unit }: the first three numbers and the unit named
+// in the cell ('' if none). Returns how many numbers the cell holds (3 for a full L x W x H,
+// more when the cell carries extras). out is reused between calls. A comma between digits is
+// a decimal point when the cell also has x/×/* separators ("23,6 x 17,7"), a separator
+// otherwise ("60,45,35"); with separators, a comma after a non-zero whole part followed by
+// exactly three digits groups thousands instead ("1,200x800x600mm").
+function tokenizeDims(value, out) {
+    out.a = 0; out.b = 0; out.c = 0; out.unit = '';
+    if (value == null) return 0;
+    if (typeof value === 'number') { out.a = value; return Number.isFinite(value) ? 1 : 0; }
+    const s = typeof value === 'string' ? value : String(value);
+    const n = s.length;
+    let crossed = false;
+    for (let i = 0; i < n; i++) {
+        const c = s.charCodeAt(i);
+        if (c === 120 || c === 88 || c === 215 || c === 42) { crossed = true; break; } // x X × *
+    }
+
+    let count = 0, i = 0;
+    while (i < n) {
+        let c = s.charCodeAt(i);
+        if ((c >= 48 && c <= 57) || (c === 46 && i + 1 < n && s.charCodeAt(i + 1) >= 48 && s.charCodeAt(i + 1) <= 57)) {
+            let v = 0, scale = 0;
+            for (; i < n; i++) {
+                c = s.charCodeAt(i);
+                if (c >= 48 && c <= 57) {
+                    v = v * 10 + (c - 48);
+                    if (scale) scale *= 10;
+                } else if (c === 44 && crossed && !scale && v > 0 && isDimsGroup(s, i + 1)) {
+                    continue;
+                } else if (!scale && (c === 46 || (c === 44 && crossed)) && i + 1 < n && s.charCodeAt(i + 1) >= 48 && s.charCodeAt(i + 1) <= 57) {
+                    scale = 1;
+                } else break;
+            }
+            if (scale) v /= scale;
+            if (count === 0) out.a = v;
+            else if (count === 1) out.b = v;
+            else if (count === 2) out.c = v;
+            count++;
+        } else if (isDimsLetter(c)) {
+            const start = i;
+            while (i < n && isDimsLetter(s.charCodeAt(i))) i++;
+            const unit = dimsWordUnit(s, start, i);
+            if (unit && !out.unit) out.unit = unit;
+        } else {
+            if ((c === 34 || c === 8243 || c === 8221) && count && !out.unit) out.unit = 'in'; // " ″ ”
+            i++;
+        }
+    }
+    return count;
+}
+
+// Unit named by a header or mapping hint. "in" alone is too common a word in headers
+// ("Dimensions in cm") to count unless it stands for the whole hint or is bracketed.
+const dimsHintUnit = (h) => {
+    if (/\bmm\b|millimet/.test(h)) return 'mm';
+    if (/\bcm\b|centimet/.test(h)) return 'cm';
+    if (/inch|\(in\)|["″]|^in$/.test(h)) return 'in';
+    if (/\(m\)|\bmet(er|re)s?\b|^m$/.test(h)) return 'm';
+    return '';
+};
+
+// The unit of a column of dimension cells (strings or numbers): the unit most of the cells
+// that name one agree on, else the hint (a header such as "Carton size (mm)" or a mapping
+// unit like "inch"), else mm when the median longest side is over DIM_MM_ABOVE, else cm.
+function inferDimsUnit(values, hint) {
+    return inferDimsUnitAcross([values], hint);
+}
+
+// Tallies behind the inference: cells naming each unit, cells with a size at all, and how
+// many of those have a longest side over DIM_MM_ABOVE (over half of them puts the median there).
+const dimsTally = () => ({ mm: 0, cm: 0, m: 0, in: 0, named: 0, sized: 0, large: 0 });
+
+const dimsTallyUnit = (t, hint) => {
+    if (t.named) {
+        let best = 'cm';
+        for (const u in DIM_UNITS) if (t[u] > t[best]) best = u;
+        if (t[best] * 2 > t.named) return best;
+    }
+    const hinted = hint && dimsHintUnit(String(hint).toLowerCase().trim());
+    if (hinted) return hinted;
+    return t.large * 2 > t.sized ? 'mm' : 'cm';
+};
+
+// The same over L, W and H held in separate (equally long) columns, which share one unit:
+// the longest side of a row is taken across all of them.
+function inferDimsUnitAcross(columns, hint) {
+    const out = { a: 0, b: 0, c: 0, unit: '' };
+    const t = dimsTally();
+    const rows = columns.reduce((n, values) => Math.max(n, values.length), 0);
+    for (let k = 0; k < rows; k++) {
+        let side = 0;
+        for (let j = 0; j < columns.length; j++) {
+            const count = tokenizeDims(columns[j][k], out);
+            if (!count) continue;
+            if (out.unit) { t[out.unit]++; t.named++; }
+            side = Math.max(side, out.a, count > 1 ? out.b : 0, count > 2 ? out.c : 0);
+        }
+        if (side > 0) { t.sized++; if (side > DIM_MM_ABOVE) t.large++; }
+    }
+    return dimsTallyUnit(t, hint);
+}
+
+const DIM_UNIT_CODES = ['', 'mm', 'cm', 'm', 'in'];
+
+// A whole column in one tokenizing pass: { unit, count, L, W, H } with L/W/H as Float64Arrays
+// in cm and count (Uint8Array) the numbers found per cell, so callers can tell "60x45x35" (3)
+// from a single length (1) or an empty cell (0). options.unit forces the column unit (as for
+// separate L/W/H columns sharing one); otherwise options.hint goes into the inference.
+function parseDimsColumn(values, { unit, hint } = {}) {
+    const n = values.length;
+    const L = new Float64Array(n), W = new Float64Array(n), H = new Float64Array(n);
+    const count = new Uint8Array(n), units = new Uint8Array(n);
+    const out = { a: 0, b: 0, c: 0, unit: '' };
+    const t = dimsTally();
+    for (let k = 0; k < n; k++) {
+        const found = tokenizeDims(values[k], out);
+        if (!found) continue;
+        count[k] = Math.min(found, 255);
+        L[k] = out.a;
+        if (found > 1) W[k] = out.b;
+        if (found > 2) H[k] = out.c;
+        if (out.unit) { t[out.unit]++; t.named++; units[k] = DIM_UNIT_CODES.indexOf(out.unit); }
+        const side = Math.max(L[k], W[k], H[k]);
+        if (side > 0) { t.sized++; if (side > DIM_MM_ABOVE) t.large++; }
+    }
+    const colUnit = unit || dimsTallyUnit(t, hint);
+    const colScale = DIM_UNITS[colUnit];
+    for (let k = 0; k < n; k++) {
+        if (!count[k]) continue;
+        const f = units[k] ? DIM_UNITS[DIM_UNIT_CODES[units[k]]] : colScale;
+        if (f === 1) continue;
+        L[k] *= f; W[k] *= f; H[k] *= f;
+    }
+    return { unit: colUnit, count, L, W, H };
+}
+
+// Convenience for a single cell: [L, W, H] in cm (unit defaulting to the cell's own, then
+// the given one, then cm), or null when the cell doesn't hold three numbers.
+function parseDims(value, unit) {
+    const out = { a: 0, b: 0, c: 0, unit: '' };
+    if (tokenizeDims(value, out) < 3) return null;
+    const f = DIM_UNITS[out.unit || unit || 'cm'];
+    return [out.a * f, out.b * f, out.c * f];
+}
+
+if (typeof module !== 'undefined' && module.exports) {
+    module.exports = { DIM_UNITS, DIM_MM_ABOVE, tokenizeDims, inferDimsUnit, inferDimsUnitAcross, parseDimsColumn, parseDims };
+}
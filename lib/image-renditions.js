@@ -0,0 +1,168 @@
+// Downsized copies of a product photo. The source is decoded once with createImageBitmap and
+// drawn to fit each requested size, largest first, each step drawn from the one before so
+// small thumbnails stay smooth. Runs in the ingest worker on an OffscreenCanvas; index.html
+// also loads it for browsers without workers, where it falls back to a DOM canvas, and for
+// ImageCache, which owns the page's product photos and their renditions.
+
+const imageCanvas = (w, h) => {
+    if (typeof OffscreenCanvas !== 'undefined') return new OffscreenCanvas(w, h);
+    const canvas = document.createElement('canvas');
+    canvas.width = w;
+    canvas.height = h;
+    return canvas;
+};
+
+const canvasBlob = (canvas, type, quality) => canvas.convertToBlob
+    ? canvas.convertToBlob({ type, quality })
+    : new Promise(resolve => canvas.toBlob(resolve, type, quality));
+
+// blob + [px, ...] (longest side) -> { renditions: [Blob, ...] in the order given, width,
+// height } of the source. Images are never scaled up.
+async function renderImageRenditions(blob, sizes, { type = 'image/webp', quality = 0.82 } = {}) {
+    const bitmap = await createImageBitmap(blob);
+    try {
+        const { width, height } = bitmap;
+        const order = sizes.map((px, k) => k).sort((a, b) => sizes[b] - sizes[a]);
+        const renditions = new Array(sizes.length);
+        let from = bitmap;
+        for (const k of order) {
+            const scale = Math.min(1, sizes[k] / Math.max(width, height));
+            const canvas = imageCanvas(Math.max(1, Math.round(width * scale)), Math.max(1, Math.round(height * scale)));
+            const ctx = canvas.getContext('2d');
+            ctx.imageSmoothingQuality = 'high';
+            ctx.drawImage(from, 0, 0, canvas.width, canvas.height);
+            renditions[k] = await canvasBlob(canvas, type, quality);
+            from = canvas;
+        }
+        return { renditions, width, height };
+    } finally {
+        bitmap.close();
+    }
+}
+
+const IMAGE_SIZES = { preview: 480, thumb: 96 };
+const IMAGE_KEY_PREFIX = 'img:';
+const isImageKey = (v) => typeof v === 'string' && v.startsWith(IMAGE_KEY_PREFIX);
+
+// Product photos by "img:N" key. Each is held as its compressed source bytes; thumbnails and
+// previews are rendered (render(key, blob, [px, ...]) -> { renditions }) the first time a row
+// needs one, and every object URL handed out is owned here: revoked on clear/retain and,
+// least recently used first, whenever the renditions go over the memory budget. Sources
+// don't count against the budget - they can't be evicted, so a workbook whose photos alone
+// exceed it would otherwise have every rendition evicted as soon as it was made.
+class ImageCache {
+    constructor({ budgetMB = 64, render = renderImageRenditions } = {}) {
+        this.render = render;
+        this.nextId = 1;
+        this.entries = new Map(); // key -> { source, urls: { size: url }, bytes: { size: n }, pending, failed }
+        this.recent = new Map(); // "key|size" -> true, least recently used first
+        this.used = 0; // rendition bytes
+        this.sourceBytes = 0;
+        this.setBudget(budgetMB);
+    }
+
+    setBudget(mb) {
+        this.budget = Math.max(8, mb || 64) * 1024 * 1024;
+        this._trim(null);
+    }
+
+    // Register a source image; returns its key.
+    add(blob) {
+        const key = IMAGE_KEY_PREFIX + this.nextId++;
+        this.entries.set(key, { source: blob, urls: {}, bytes: {}, pending: null, failed: false });
+        this.sourceBytes += blob.size;
+        return key;
+    }
+
+    has(key) {
+        return this.entries.has(key);
+    }
+
+    // Object URL of a rendition ('thumb' | 'preview') if it's in memory, else null.
+    url(key, size) {
+        const e = this.entries.get(key);
+        const url = e && e.urls[size];
+        if (!url) return null;
+        this.recent.delete(key + '|' + size);
+        this.recent.set(key + '|' + size, true);
+        return url;
+    }
+
+    // Resolves with the rendition's URL, rendering it first if needed (null if the image
+    // can't be decoded).
+    async load(key, size) {
+        const e = this.entries.get(key);
+        if (!e || e.failed) return null;
+        if (!e.urls[size]) {
+            if (!e.pending) e.pending = this._render(key, e).finally(() => { e.pending = null; });
+            await e.pending;
+        }
+        return this.url(key, size);
+    }
+
+    async _render(key, e) {
+        const names = Object.keys(IMAGE_SIZES);
+        let out;
+        try {
+            out = await this.render(key, e.source, names.map(n => IMAGE_SIZES[n]));
+        } catch (err) {
+            e.failed = true;
+            return;
+        }
+        if (this.entries.get(key) !== e) return; // cleared while rendering
+        names.forEach((name, k) => {
+            const blob = out.renditions[k];
+            this._release(key, e, name);
+            e.urls[name] = URL.createObjectURL(blob);
+            e.bytes[name] = blob.size;
+            this.used += blob.size;
+            this.recent.set(key + '|' + name, true);
+        });
+        // Later renditions only need the preview, so it replaces a larger source
+        const preview = out.renditions[names.indexOf('preview')];
+        if (preview.size < e.source.size) {
+            this.sourceBytes += preview.size - e.source.size;
+            e.source = preview;
+        }
+        this._trim(key);
+    }
+
+    _release(key, e, size) {
+        if (!e.urls[size]) return;
+        URL.revokeObjectURL(e.urls[size]);
+        this.used -= e.bytes[size];
+        delete e.urls[size];
+        this.recent.delete(key + '|' + size);
+    }
+
+    // Evict renditions, least recently used first, until under budget. keep's renditions
+    // (the ones just asked for) stay; sources are only released by clear/retain.
+    _trim(keep) {
+        for (const id of this.recent.keys()) {
+            if (this.used <= this.budget) return;
+            const [key, size] = id.split('|');
+            if (key !== keep) this._release(key, this.entries.get(key), size);
+        }
+    }
+
+    _drop(key) {
+        const e = this.entries.get(key);
+        Object.keys(e.urls).forEach(size => this._release(key, e, size));
+        this.sourceBytes -= e.source.size;
+        this.entries.delete(key);
+    }
+
+    // Drop every image whose key isn't in keys (after rows are replaced or deleted).
+    retain(keys) {
+        const live = new Set(keys);
+        for (const key of [...this.entries.keys()]) if (!live.has(key)) this._drop(key);
+    }
+
+    clear() {
+        this.retain([]);
+    }
+}
+
+if (typeof module !== 'undefined' && module.exports) {
+    module.exports = { renderImageRenditions, ImageCache, IMAGE_SIZES, IMAGE_KEY_PREFIX, isImageKey };
+}
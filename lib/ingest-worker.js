@@ -0,0 +1,57 @@
+// Ingest worker: reads uploaded files off the main thread. Driven by WorkerPool
+// (lib/worker-pool.js); CSV rows are posted back in chunks as { taskId, progress } messages
+// so the grid can fill while the rest of the file is still being read, workbooks come back
+// with their bytes and media transferred, and product photos are downsized here.
+importScripts('csv-stream.js', 'xlsx-ingest.js', 'image-renditions.js');
+
+const PROGRESS_ROWS = 5000;
+let cancelledJob = 0;
+
+const isCancelled = (jobId) => jobId <= cancelledJob;
+
+const handlers = {
+    // { file, delimiter? } -> { rows, delimiter }. Parsed rows go back in chunks as progress
+    // messages { rows: [[...fields]], rowsSoFar, loaded, total } while the file is still being read.
+    async csv({ taskId, jobId, file, delimiter }) {
+        const result = await readDelimitedFile(file, (rows, progress) => {
+            self.postMessage({ taskId, progress: { rows, ...progress } });
+        }, { delimiter, chunkRows: PROGRESS_ROWS, isCancelled: () => isCancelled(jobId) });
+        return result && { result };
+    },
+
+    // { file } -> { buffer, sheets, sheetName, sheetNames, rows, media, images } (see
+    // readXlsxWorkbook).
+    // The file is read and unzipped once; buffer is the original bytes, kept by the caller for
+    // the linked-sheet export.
+    async xlsx({ jobId, file }) {
+        const buffer = await file.arrayBuffer();
+        const book = await readXlsxWorkbook(new Uint8Array(buffer));
+        if (isCancelled(jobId)) return null;
+        return { result: { buffer, ...book }, transfer: [buffer, ...book.media.map(m => m.bytes.buffer)] };
+    },
+
+    // { blob, sizes, type? } -> { renditions, width, height } (see renderImageRenditions).
+    async thumbnail({ blob, sizes, type }) {
+        return { result: await renderImageRenditions(blob, sizes, { type }) };
+    }
+};
+
+self.onmessage = async (e) => {
+    const msg = e.data;
+    if (msg.type === 'cancel') {
+        cancelledJob = Math.max(cancelledJob, msg.jobId);
+        return;
+    }
+    const handler = handlers[msg.type];
+    if (!handler) {
+        self.postMessage({ taskId: msg.taskId, error: `Unknown task type: ${msg.type}` });
+        return;
+    }
+    try {
+        const reply = await handler(msg);
+        if (!reply) self.postMessage({ taskId: msg.taskId, result: null });
+        else self.postMessage({ taskId: msg.taskId, result: reply.result }, reply.transfer || []);
+    } catch (err) {
+        self.postMessage({ taskId: msg.taskId, error: err.message || String(err) });
+    }
+};
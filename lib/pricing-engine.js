@@ -0,0 +1,1136 @@
+// Landed cost pricing engine: constants, pricing formulas, the batch pricing kernel and the
+// courier rule index. Loaded as a classic script by index.html and importScripts()'d by the
+// pricing worker, so everything here must stay free of DOM and React.
+
+const CONTAINER_CBM = { "40HQ": 76, "40GP": 67.5, "20GP": 33.2 };
+// Maximum cargo weight (kg) each container type is rated for.
+const CONTAINER_PAYLOAD_KG = { "40HQ": 26500, "40GP": 26700, "20GP": 28200 };
+const VAT_RATE = 0.20;
+const VOL_DIVISOR = 5000;
+const DX_SURCHARGE_THRESHOLD = 24.99;
+
+const DEFAULT_COURIER_RULES = [
+    { id: 'evri_packet', name: 'Evri / Packet', maxL: 120, maxGirth: 225, maxWeight: 2, maxVol: 40, price: 1.85, days: '2-3', logo: 'Logos/evri_logo_png.png' },
+    { id: 'evri_packet_large', name: 'Evri / Packet over 40L', maxL: 120, maxGirth: 225, maxWeight: 2, minVol: 40, price: 2.25, days: '2-3', logo: 'Logos/evri_logo_png.png' },
+    { id: 'evri_parcel', name: 'Evri / Parcel', maxL: 120, maxGirth: 225, maxWeight: 15, price: 2.33, days: '2-3', logo: 'Logos/evri_logo_png.png' },
+    { id: 'yodel_express', name: 'Yodel / Express', maxL: 90, maxVolCm3: 110000, maxWeight: 17, price: 2.30, days: '1-2', logo: 'Logos/Yodel_logo.png' },
+    { id: 'dpd_48', name: 'DPD / 48 Hour', maxL: 120, maxW: 70, maxH: 60, maxWeight: 30, price: 4.51, days: '1-2', logo: 'Logos/DPD_logo(red)2015.png' },
+    { id: 'pf_48', name: 'Parcelforce / 48 Hour', maxL: 150, maxGirth: 300, maxWeight: 30, price: 5.40, extraPerParcel: 2.70, type: 'multi', days: '1-2', logo: 'Logos/Parcel Force Logo.png' },
+    { id: 'evri_ll', name: 'Evri / L&L', maxL: 180, maxGirth: 380, maxWeight: 30, price: 8.00, days: '3-5', logo: 'Logos/evri_logo_png.png' },
+    { id: 'dx_std', name: 'DX / Standard', maxL: 150, maxWeight: 30, price: 5.40, extraPerParcel: 3.30, type: 'dx_std', days: '2-3', logo: 'Logos/DX Standard Lengths.png' },
+    { id: 'dx_len', name: 'DX / Lengths', maxL: 200, maxWeight: 30, price: 12.21, type: 'dx_len', days: '2-3', logo: 'Logos/DX Standard Lengths.png' }
+];
+
+const num = (n) => { const x = typeof n === "string" ? parseFloat(n) : n; return Number.isFinite(x) ? x : 0; };
+// A settings value as entered (0 included), or fallback when the field is empty or not a number.
+const numOr = (n, fallback) => { const x = typeof n === "string" ? parseFloat(n) : n; return Number.isFinite(x) ? x : fallback; };
+const round2 = (x) => Math.round((x + Number.EPSILON) * 100) / 100;
+const cbm = (L, W, H) => (num(L) / 100) * (num(W) / 100) * (num(H) / 100);
+
+const vatComponent = (sellIncVat, vatRate = VAT_RATE) => sellIncVat - sellIncVat / (1 + vatRate);
+
+const requiredSellForMargin = (targetMarginPct, purchaseInc, commissionPct, ppCost, ppCharged, vatRate = VAT_RATE) => {
+    const M = Math.max(0, Math.min(0.99, targetMarginPct / 100));
+    const comm = Math.max(0, commissionPct) / 100;
+    const numer = purchaseInc + Math.max(0, ppCost) - Math.max(0, ppCharged);
+    const denom = 1 - M - comm - (vatRate / (1 + vatRate));
+    if (denom <= 0) return NaN;
+    return numer / denom;
+};
+
+const maxPurchaseForMargin = (targetMarginPct, sellIncVat, commissionPct, ppCost, ppCharged, vatRate = VAT_RATE) => {
+    const M = Math.max(0, Math.min(0.99, targetMarginPct / 100));
+    const comm = Math.max(0, commissionPct) / 100;
+    const factor = 1 - M - comm - (vatRate / (1 + vatRate));
+    return sellIncVat * factor - Math.max(0, ppCost) + Math.max(0, ppCharged);
+};
+
+const computeProfit = (sellIncVat, purchaseInc, commissionPct, ppCost, ppCharged, vatRate = VAT_RATE) => {
+    const comm = Math.max(0, commissionPct) / 100;
+    const commission = sellIncVat * comm;
+    const totalCost = purchaseInc + vatComponent(sellIncVat, vatRate) + commission + Math.max(0, ppCost) - Math.max(0, ppCharged);
+    return sellIncVat - totalCost;
+};
+
+// ========== PRICE ENDINGS ==========
+// Ending rules are compiled once into a snapper: snap(price) returns the snapped price and
+// snap.snapAll(prices, out = prices, start, end) does a whole column in one pass. Specs are
+// plain objects so they can be posted to workers:
+//   { mode: 'nearest', endings: [0.49, 0.99], allowDown, tolerancePct }
+//       nearest price with an allowed ending; going down only if allowed and within
+//       tolerancePct of the price
+//   { mode: 'floor', endings: [0.99] }   this pound's ending (bulk '.99' buttons)
+//   { mode: 'round' }                    whole pounds
+// Endings are kept as a sorted table of pence fractions, so the nearest candidate above
+// and below a price is a binary search plus arithmetic.
+const DEFAULT_ENDINGS = [0.49, 0.99];
+
+// Prices within this of an ending are on it (float error from pounds/pence arithmetic).
+const SNAP_EPSILON = 1e-9;
+
+// "0.49, 99" -> [0.49, 0.99]; whole numbers are pence.
+const parseEndings = (text) => {
+    const vals = String(text || '').split(/[^0-9.]+/).filter(Boolean)
+        .map(p => { const x = parseFloat(p); return x < 1 ? x : x / 100; })
+        .filter(Number.isFinite);
+    return vals.length ? vals : DEFAULT_ENDINGS;
+};
+
+// Settings panel price rules -> snapper spec (null when rules are off).
+const priceRuleSpec = (rules) => rules && rules.enabled ? {
+    mode: 'nearest',
+    endings: parseEndings(rules.endingsText),
+    allowDown: !!rules.allowDown,
+    tolerancePct: parseFloat(rules.tolerancePct) || 0
+} : null;
+
+function compileEndingSnapper(spec) {
+    let snap;
+    if (spec.mode === 'round') {
+        snap = Math.round;
+    } else {
+        const table = [...new Set((spec.endings && spec.endings.length ? spec.endings : DEFAULT_ENDINGS)
+            .map(e => e - Math.floor(e)))].sort((a, b) => a - b);
+        const last = table.length - 1;
+        // index of the first ending >= frac (table.length when there is none)
+        const ceilIndex = (frac) => {
+            let lo = 0, hi = table.length;
+            while (lo < hi) { const mid = (lo + hi) >> 1; if (table[mid] < frac) lo = mid + 1; else hi = mid; }
+            return lo;
+        };
+        if (spec.mode === 'floor') {
+            const cents = table[0];
+            snap = (price) => Math.floor(price) + cents;
+        } else {
+            const allowDown = !!spec.allowDown;
+            const tol = Math.max(0, num(spec.tolerancePct)) / 100;
+            snap = (price) => {
+                if (!Number.isFinite(price)) return price;
+                if (price < 0) return table[0];
+                const pounds = Math.floor(price);
+                let j = ceilIndex(price - pounds);
+                // price - pounds carries float error (10.49 - 10 = 0.49000000000000021), so
+                // settle j on pounds + ending itself: a price already on an ending keeps it
+                while (j > 0 && pounds + table[j - 1] >= price - SNAP_EPSILON) j--;
+                while (j < table.length && pounds + table[j] < price - SNAP_EPSILON) j++;
+                const up = j <= last ? pounds + table[j] : pounds + 1 + table[0];
+                if (!allowDown || Math.abs(up - price) <= SNAP_EPSILON) return up;
+                const down = j > 0 ? pounds + table[j - 1] : pounds > 0 ? pounds - 1 + table[last] : -1;
+                if (down < 0 || price - down > tol * price) return up;
+                return price - down <= up - price ? down : up;
+            };
+        }
+    }
+    const snapper = (price) => snap(price);
+    snapper.spec = spec;
+    snapper.snapAll = (prices, out = prices, start = 0, end = prices.length) => {
+        for (let i = start; i < end; i++) {
+            const x = prices[i];
+            out[i] = x === x ? snap(x) : x;
+        }
+        return out;
+    };
+    return snapper;
+}
+
+// Compiled snappers by spec, so render-time callers can pass a spec every time.
+const endingSnapperCache = new Map();
+
+function endingSnapper(spec) {
+    if (!spec) return null;
+    const key = JSON.stringify(spec);
+    let snapper = endingSnapperCache.get(key);
+    if (!snapper) {
+        if (endingSnapperCache.size >= 64) endingSnapperCache.clear();
+        snapper = compileEndingSnapper(spec);
+        endingSnapperCache.set(key, snapper);
+    }
+    return snapper;
+}
+
+// Bulk price endings ('round', '.99', '.95', '.49') or a snapper spec. Params carry the
+// name/spec so they can be posted to workers; the kernel resolves it to a snapper.
+const NAMED_ENDINGS = { round: { mode: 'round' }, '.99': { mode: 'floor', endings: [0.99] }, '.95': { mode: 'floor', endings: [0.95] }, '.49': { mode: 'floor', endings: [0.49] } };
+
+const makeEndingSnap = (ending) => {
+    if (!ending) return null;
+    return endingSnapper(typeof ending === 'string' ? NAMED_ENDINGS[ending] : ending);
+};
+
+// Snap one price under the settings panel rules.
+const applyPriceRule = (base, rules) => {
+    const snapper = endingSnapper(priceRuleSpec(rules));
+    return snapper ? snapper(base) : base;
+};
+
+// ========== CONTAINER LOADING ==========
+// The 3D loading model counts whole cartons into the container's internal dimensions
+// instead of dividing usable CBM by carton volume. Packing is a guillotine heuristic:
+// for each of the six carton orientations, fill a block of whole cartons from one corner,
+// then pack the leftover slabs the same way (cut length-first and width-first, keeping
+// the better). Work is in whole millimetres so sub-box keys are exact.
+const CONTAINER_DIMS = { "40HQ": [1203, 235, 269], "40GP": [1203, 235, 239], "20GP": [590, 235, 239] };
+const LOADING_CACHE_SIZE = 4096;
+const loadingCache = new Map();
+
+const toMm = (cm) => Math.ceil(cm * 10 - 1e-6);
+
+// Most cartons that fit in an x*y*z box (mm); dims are the carton's sorted sides.
+// Boxes are keyed by sorted sides: with every orientation allowed, turning the box
+// doesn't change what fits.
+function guillotinePack(x, y, z, dims) {
+    const turns = [];
+    const [a, b, c] = dims;
+    for (const t of [[a, b, c], [a, c, b], [b, a, c], [b, c, a], [c, a, b], [c, b, a]]) {
+        if (!turns.some(u => u[0] === t[0] && u[1] === t[1] && u[2] === t[2])) turns.push(t);
+    }
+    const unit = a * b * c;
+    const memo = new Map();
+    let best = null;
+
+    const fill = (x, y, z, top) => {
+        if (x < a || y < a || z < a) return 0;
+        const s = x <= y ? (y <= z ? [x, y, z] : x <= z ? [x, z, y] : [z, x, y]) : (x <= z ? [y, x, z] : y <= z ? [y, z, x] : [z, y, x]);
+        const key = s[0] + ',' + s[1] + ',' + s[2];
+        if (!top && memo.has(key)) return memo.get(key);
+        const bound = Math.floor((x * y * z) / unit);
+        let most = 0;
+        for (const [p, q, r] of turns) {
+            const nx = Math.floor(x / p), ny = Math.floor(y / q), nz = Math.floor(z / r);
+            if (!nx || !ny || !nz) continue;
+            const bx = nx * p, by = ny * q, bz = nz * r;
+            const above = fill(bx, by, z - bz, false);
+            const lengthFirst = fill(x - bx, y, z, false) + fill(bx, y - by, z, false);
+            const widthFirst = fill(x, y - by, z, false) + fill(x - bx, by, z, false);
+            const count = nx * ny * nz + above + Math.max(lengthFirst, widthFirst);
+            if (count > most) {
+                most = count;
+                if (top) best = { orientation: [p, q, r], block: [nx, ny, nz] };
+            }
+            if (most >= bound) break;
+        }
+        memo.set(key, most);
+        return most;
+    };
+
+    const count = fill(x, y, z, true);
+    return { count, ...best };
+}
+
+// Cartons of L*W*H cm that load into one container, cached per (container, carton) signature.
+// Returns { count, orientation: [l, w, h] cm of the corner block, block: [nx, ny, nz], fillPct }
+// or null when the carton or container is unknown.
+function containerLoad(containerType, L, W, H) {
+    const box = CONTAINER_DIMS[containerType];
+    if (!box || !(L > 0 && W > 0 && H > 0)) return null;
+    const dims = [toMm(L), toMm(W), toMm(H)].sort((p, q) => p - q);
+    const key = `${containerType}|${dims[0]}x${dims[1]}x${dims[2]}`;
+    const hit = loadingCache.get(key);
+    if (hit) return hit;
+
+    const [x, y, z] = box.map(d => d * 10);
+    const packed = guillotinePack(x, y, z, dims);
+    const result = Object.freeze({
+        count: packed.count,
+        orientation: packed.count ? packed.orientation.map(d => d / 10) : null,
+        block: packed.count ? packed.block : null,
+        fillPct: (packed.count * dims[0] * dims[1] * dims[2]) / (x * y * z) * 100
+    });
+    if (loadingCache.size >= LOADING_CACHE_SIZE) loadingCache.clear();
+    loadingCache.set(key, result);
+    return result;
+}
+
+// ========== BATCH PRICING KERNEL ==========
+// Every view prices through priceBatch: inputs are parallel numeric columns, outputs are
+// Float64Arrays, and all per-batch invariants (FX reciprocal, margin denominator, VAT
+// fraction) are hoisted out of the row loop.
+const PRICE_STATUS = ['good', 'review', 'low'];
+const REVIEW_MARGIN_PCT = 15;
+
+// Resolve global settings + pricing inputs into the scalar parameters priceBatch uses.
+const pricingParams = (g, { marginPct, commissionPct, ppCost, ppCharged = 0, vatRate = VAT_RATE, ending = null }) => {
+    const cont = CONTAINER_CBM[g?.containerType] || 76;
+    const fill = numOr(g?.utilisationPct, 89.5) / 100;
+    // a payload limit set in settings (e.g. for road haulage) caps every container type
+    const payload = (type) => Math.min(CONTAINER_PAYLOAD_KG[type] || CONTAINER_PAYLOAD_KG['40HQ'], num(g?.payloadKg) || Infinity);
+    return {
+        fx: numOr(g?.fxGbpToUsd, 1.30),
+        sea: numOr(g?.seaFreightGBP, 2800),
+        containerType: CONTAINER_CBM[g?.containerType] ? g.containerType : '40HQ',
+        effCBM: cont * fill,
+        payloadKg: payload(g?.containerType),
+        // container type to load cartons into under the 3D model, null for CBM x fill %
+        loading: g?.loadingMode === '3d' ? (CONTAINER_DIMS[g?.containerType] ? g.containerType : '40HQ') : null,
+        // container types an order can be split across ('auto' mode), null for the fixed type
+        containers: g?.containerMode === 'auto'
+            ? CONTAINER_TYPES.map(type => ({ type, effCBM: CONTAINER_CBM[type] * fill, payloadKg: payload(type), sea: numOr(g?.['freight' + type], DEFAULT_CONTAINER_FREIGHT[type]) }))
+            : null,
+        lcl: lclParams(g),
+        marginPct: num(marginPct),
+        commissionPct: num(commissionPct),
+        ppCost: num(ppCost),
+        ppCharged: num(ppCharged),
+        vatRate,
+        ending
+    };
+};
+
+// Allocate an empty column set for n rows (numeric inputs only; labels live alongside).
+const makePriceColumns = (n) => ({
+    n,
+    unitUSD: new Float64Array(n),
+    pack: new Float64Array(n),
+    L: new Float64Array(n),
+    W: new Float64Array(n),
+    H: new Float64Array(n),
+    weight: new Float64Array(n)
+});
+
+const makePriceOutputs = (n) => ({
+    n,
+    vol: new Float64Array(n),
+    cartons: new Float64Array(n),
+    units: new Float64Array(n),
+    landedUnit: new Float64Array(n),
+    landedPack: new Float64Array(n),
+    rawSell: new Float64Array(n),
+    sell: new Float64Array(n),
+    profit: new Float64Array(n),
+    marginPct: new Float64Array(n),
+    status: new Uint8Array(n),
+    weightBound: new Uint8Array(n) // 1 when the payload limit, not volume, sets the carton count
+});
+
+// cols: { n, unitUSD, pack, L, W, H } plus optional per-row overrides
+//   vol (CBM per set), units (units per container, 0 = derive), marginPct, ppCost,
+//   sell (fixed sell price, 0 = required sell for the target margin),
+//   freight (sea freight per unit, 0 = the container's freight over its units).
+// With p.loading set, single-carton rows count cartons with containerLoad; multi-carton
+// sets (cols.cartons[i]) and rows without dimensions keep the CBM model. Either way the
+// count is capped by p.payloadKg over the carton (or set) gross weight, cols.weight.
+// Rows [start, end) are written into out (allocated when omitted).
+function priceBatch(cols, p, out, start = 0, end = cols.n) {
+    out = out || makePriceOutputs(cols.n);
+    const { unitUSD, pack: packCol, L, W, H, weight } = cols;
+    const volIn = cols.vol, unitsIn = cols.units, marginIn = cols.marginPct, ppIn = cols.ppCost, sellIn = cols.sell;
+    const loading = p.loading, sets = cols.cartons, freightIn = cols.freight;
+    const invFx = p.fx > 0 ? 1 / p.fx : 0;
+    const effCBM = p.effCBM, sea = p.sea, payload = p.payloadKg, snap = makeEndingSnap(p.ending);
+    const comm = Math.max(0, p.commissionPct) / 100;
+    const vatFrac = p.vatRate / (1 + p.vatRate);
+    const keep = 1 - comm - vatFrac; // share of the sell price left after VAT and commission
+    const ppCharged = Math.max(0, p.ppCharged);
+    const baseM = Math.max(0, Math.min(0.99, p.marginPct / 100));
+    const basePp = Math.max(0, p.ppCost);
+    const target = p.marginPct;
+
+    for (let i = start; i < end; i++) {
+        const pack = packCol[i] >= 1 ? packCol[i] : 1;
+        const vol = volIn ? volIn[i] : (L[i] / 100) * (W[i] / 100) * (H[i] / 100);
+        let units, cartons, bound = 0;
+        if (unitsIn && unitsIn[i] > 0) {
+            units = Math.floor(unitsIn[i]);
+            cartons = pack > 1 ? Math.floor(units / pack) : NaN;
+        } else {
+            cartons = loading && !(sets && sets[i]) && L[i] > 0 && W[i] > 0 && H[i] > 0
+                ? containerLoad(loading, L[i], W[i], H[i]).count
+                : vol > 0 ? Math.floor(effCBM / vol) : 0;
+            const kg = sets && sets[i] ? cartonsKg(sets[i]) : weight ? weight[i] : 0;
+            if (kg > 0 && payload > 0 && payload < cartons * kg) {
+                cartons = Math.floor(payload / kg);
+                bound = 1;
+            }
+            units = cartons * pack;
+        }
+
+        const freight = freightIn && freightIn[i] > 0 ? freightIn[i] : units > 0 ? sea / units : 0;
+        const landedUnit = round2(unitUSD[i] * invFx + freight);
+        const landedPack = round2(landedUnit * pack);
+        const purchase = pack > 1 ? landedPack : landedUnit;
+
+        const M = marginIn ? Math.max(0, Math.min(0.99, marginIn[i] / 100)) : baseM;
+        const pp = ppIn ? Math.max(0, ppIn[i]) : basePp;
+        const denom = keep - M;
+        const netCost = purchase + pp - ppCharged;
+
+        out.vol[i] = vol;
+        out.cartons[i] = cartons;
+        out.units[i] = units;
+        out.weightBound[i] = bound;
+        out.landedUnit[i] = landedUnit;
+        out.landedPack[i] = landedPack;
+        out.rawSell[i] = denom > 0 ? netCost / denom : NaN;
+        out.profit[i] = netCost; // parked here until the sell price is known
+    }
+
+    // Price endings over the whole range in one pass, then profit/margin off the final sell.
+    if (snap) snap.snapAll(out.rawSell, out.sell, start, end);
+    else out.sell.set(out.rawSell.subarray(start, end), start);
+
+    for (let i = start; i < end; i++) {
+        const sell = sellIn && sellIn[i] > 0 ? sellIn[i] : out.sell[i];
+        const profit = sell > 0 ? sell * keep - out.profit[i] : NaN;
+        const marginPct = sell > 0 ? (profit / sell) * 100 : NaN;
+        const rowTarget = marginIn ? marginIn[i] : target;
+        out.sell[i] = sell;
+        out.profit[i] = profit;
+        out.marginPct[i] = marginPct;
+        // rows sold at exactly the target margin count as on target despite float noise
+        out.status[i] = marginPct >= rowTarget - 1e-9 ? 0 : marginPct >= REVIEW_MARGIN_PCT ? 1 : 2;
+    }
+    return out;
+}
+
+// Courier rules are compiled once per rules array (the settings panel replaces the
+// array on every edit, so identity is the rebuild signal). Compiled rules are ordered
+// by base price, which is a lower bound on every rule type's cost, so the cheapest
+// fit can stop scanning as soon as no remaining rule could undercut it.
+const compiledCourierCache = new WeakMap();
+
+function compileCourierRules(rules = DEFAULT_COURIER_RULES) {
+    const cached = compiledCourierCache.get(rules);
+    if (cached) return cached;
+
+    const compiled = rules.map((r, idx) => {
+        const parts = String(r.name || '').split('/');
+        const price = Number(r.price);
+        return {
+            idx,
+            id: r.id,
+            logo: r.logo,
+            days: r.days || '2-3',
+            carrier: parts[0].trim(),
+            service: (parts[1] || '').trim(),
+            type: r.type || null,
+            price: r.price,
+            extra: r.extraPerParcel || 0,
+            // NaN prices (cleared inputs) can't bound anything, so they sort first
+            bound: Number.isFinite(price) ? price : -Infinity,
+            maxL: r.maxL || 0, maxW: r.maxW || 0, maxH: r.maxH || 0,
+            maxGirth: r.maxGirth || 0, maxWeight: r.maxWeight || 0,
+            maxVol: r.maxVol || 0, minVol: r.minVol || 0, maxVolCm3: r.maxVolCm3 || 0,
+            reasonKg: r.maxWeight ? `Under ${r.maxWeight}kg` : '',
+            reasonL: r.maxVol ? `Under ${r.maxVol}L` : ''
+        };
+    }).sort((a, b) => a.bound - b.bound || a.idx - b.idx);
+
+    const version = hashCourierRules(rules);
+    const result = { rules: compiled, version, quote: (l, w, h, weightKg, all) => cachedCourierQuote(compiled, version, l, w, h, weightKg, all) };
+    compiledCourierCache.set(rules, result);
+    return result;
+}
+
+// ========== COURIER QUOTE CACHE ==========
+// Supplier sheets repeat the same few carton sizes, so quotes are memoised in a bounded
+// LRU (a Map's insertion order doubles as the recency list). Keys are the sorted integer
+// dims, the weight and a hash of the rules; quoting under a different rule set drops
+// the whole cache. Cached quotes are frozen because every caller shares them.
+const COURIER_CACHE_SIZE = 4096;
+const courierQuoteCache = { entries: new Map(), version: null, hits: 0, misses: 0 };
+
+// FNV-1a over the serialised rules: equal rule sets share a version even when the
+// settings panel hands us a fresh array.
+function hashCourierRules(rules) {
+    const text = JSON.stringify(rules);
+    let hash = 0x811c9dc5;
+    for (let i = 0; i < text.length; i++) {
+        hash ^= text.charCodeAt(i);
+        hash = Math.imul(hash, 0x01000193);
+    }
+    return (hash >>> 0).toString(36);
+}
+
+function cachedCourierQuote(compiled, version, l, w, h, weightKg, all) {
+    // Auto-sort dimensions so L is always longest, H is always shortest
+    let L = Math.max(0, l | 0), W = Math.max(0, w | 0), H = Math.max(0, h | 0), t;
+    if (W > L) { t = L; L = W; W = t; }
+    if (H > W) { t = W; W = H; H = t; }
+    if (W > L) { t = L; L = W; W = t; }
+    const weight = Math.max(0, Number(weightKg || 0));
+
+    const cache = courierQuoteCache;
+    if (cache.version !== version) {
+        cache.entries.clear();
+        cache.version = version;
+    }
+    const key = `${L}x${W}x${H}|${weight}|${all ? 1 : 0}`;
+    const hit = cache.entries.get(key);
+    if (hit !== undefined) {
+        cache.hits++;
+        cache.entries.delete(key);
+        cache.entries.set(key, hit);
+        return hit;
+    }
+    cache.misses++;
+    let quote = quoteCompiledCouriers(compiled, L, W, H, weight, all);
+    if (quote) quote = Object.freeze(all ? quote.map(Object.freeze) : quote);
+    cache.entries.set(key, quote);
+    if (cache.entries.size > COURIER_CACHE_SIZE) cache.entries.delete(cache.entries.keys().next().value);
+    return quote;
+}
+
+// Hit/miss counters for instrumentation (per realm: each pricing worker keeps its own).
+function courierCacheStats() {
+    const c = courierQuoteCache;
+    const lookups = c.hits + c.misses;
+    return { hits: c.hits, misses: c.misses, size: c.entries.size, capacity: COURIER_CACHE_SIZE, hitRate: lookups ? c.hits / lookups : 0 };
+}
+
+function resetCourierCache() {
+    courierQuoteCache.entries.clear();
+    courierQuoteCache.version = null;
+    courierQuoteCache.hits = 0;
+    courierQuoteCache.misses = 0;
+}
+
+// Single pass over compiled rules for normalised inputs (L >= W >= H integers, weight
+// >= 0). With all=false returns the cheapest fit (or null), otherwise every fit sorted
+// by cost; ties keep the original rule order.
+function quoteCompiledCouriers(compiled, L, W, H, weight, all) {
+    const volumeCm3 = L * W * H;
+    const volumeL = volumeCm3 / 1000;
+    const girth = L + 2 * (W + H);
+    const volKg = volumeCm3 / VOL_DIVISOR;
+
+    const fits = all ? [] : null;
+    let best = null, bestCost = Infinity, bestParcels = 1;
+    for (let i = 0; i < compiled.length; i++) {
+        const r = compiled[i];
+        if (!all && best && r.bound > bestCost) break;
+        if (r.maxL && L > r.maxL) continue;
+        if (r.maxW && W > r.maxW) continue;
+        if (r.maxH && H > r.maxH) continue;
+        if (r.maxGirth && girth > r.maxGirth) continue;
+        if (r.maxWeight && weight > r.maxWeight) continue;
+        if (r.maxVol && volumeL > r.maxVol) continue;
+        if (r.minVol && volumeL <= r.minVol) continue;
+        if (r.maxVolCm3 && volumeCm3 > r.maxVolCm3) continue;
+
+        let cost = r.price;
+        let parcels = 1;
+        if (r.type === 'multi') {
+            parcels = Math.max(1, Math.ceil(weight / 30));
+            cost = r.price + (parcels - 1) * r.extra;
+        } else if (r.type === 'dx_std') {
+            parcels = Math.max(1, Math.ceil(Math.max(weight, volKg) / 30));
+            const surcharge = (weight > DX_SURCHARGE_THRESHOLD || volKg > DX_SURCHARGE_THRESHOLD) ? 1.75 * parcels : 0;
+            cost = r.price + (parcels - 1) * r.extra + surcharge;
+        } else if (r.type === 'dx_len') {
+            parcels = Math.max(1, Math.ceil(Math.max(weight, volKg) / 30));
+            cost = r.price * parcels;
+        }
+
+        if (all) {
+            fits.push({ r, cost, parcels });
+        } else if (!best || cost < bestCost || (cost === bestCost && r.idx < best.idx)) {
+            best = r; bestCost = cost; bestParcels = parcels;
+        }
+    }
+    if (!all) return best ? courierFit(best, bestCost, bestParcels, weight, volumeL) : null;
+    fits.sort((a, b) => (a.cost - b.cost) || (a.r.idx - b.r.idx));
+    return fits.map(f => courierFit(f.r, f.cost, f.parcels, weight, volumeL));
+}
+
+function courierFit(r, cost, parcels, weight, volumeL) {
+    const reasons = [];
+    if (weight > 0 && r.maxWeight && weight <= r.maxWeight) reasons.push(r.reasonKg);
+    if (r.maxVol && volumeL <= r.maxVol) reasons.push(r.reasonL);
+    return {
+        carrier: r.carrier,
+        service: r.service,
+        cost: cost,
+        parcels: parcels,
+        logo: r.logo,
+        id: r.id,
+        days: r.days,
+        reason: reasons.join(', ')
+    };
+}
+
+function chooseCourier(l, w, h, weightKg, rules = DEFAULT_COURIER_RULES) {
+    return compileCourierRules(rules).quote(l, w, h, weightKg, false);
+}
+
+function getAllCouriers(l, w, h, weightKg, rules = DEFAULT_COURIER_RULES) {
+    return compileCourierRules(rules).quote(l, w, h, weightKg, true);
+}
+
+// ========== MULTI-CARTON SHIPPING ==========
+// A product or order made of several cartons can ship as separate parcels, or with some
+// cartons strapped together into bundles. planShipment finds the cheapest partition into
+// bundles with a DP over subsets (3^n submask steps): bundle quotes come through the
+// courier quote cache, and a bundle no rule accepts rules out all of its supersets,
+// because strapping only ever grows length, width, stack height and weight.
+const MAX_PLAN_CARTONS = 12;
+
+// cartons: [[L, W, H, weightKg], ...] in cm/kg.
+const cartonsCBM = (cartons) => cartons.reduce((sum, c) => sum + (c[0] / 100) * (c[1] / 100) * (c[2] / 100), 0);
+const cartonsKg = (cartons) => cartons.reduce((sum, c) => sum + num(c[3]), 0);
+
+function planShipment(cartons, rules = DEFAULT_COURIER_RULES) {
+    const n = cartons.length;
+    if (!n) return null;
+    const compiled = compileCourierRules(rules);
+    // Each carton lies flat (shortest side up); a bundle is as long and wide as its
+    // largest carton and as tall as the stack.
+    const flat = cartons.map(c => {
+        const d = [num(c[0]), num(c[1]), num(c[2])].sort((a, b) => b - a);
+        return [d[0], d[1], d[2], Math.max(0, num(c[3]))];
+    });
+    if (n > MAX_PLAN_CARTONS) {
+        // Too many to search; ship every carton on its own.
+        const bundles = flat.map((c, i) => ({ cartons: [i], dims: c.slice(0, 3), weight: c[3], courier: compiled.quote(c[0], c[1], c[2], c[3], false) }));
+        return bundles.some(b => !b.courier) ? null : shipmentPlan(bundles, n);
+    }
+
+    const size = 1 << n;
+    const bL = new Float64Array(size), bW = new Float64Array(size), bH = new Float64Array(size), bKg = new Float64Array(size);
+    const quotes = new Array(size).fill(null);
+    for (let mask = 1; mask < size; mask++) {
+        const low = mask & -mask, rest = mask ^ low, c = flat[31 - Math.clz32(low)];
+        bL[mask] = Math.max(bL[rest], c[0]);
+        bW[mask] = Math.max(bW[rest], c[1]);
+        bH[mask] = bH[rest] + c[2];
+        bKg[mask] = Math.round((bKg[rest] + c[3]) * 1000) / 1000; // grams, so summation order can't tip a weight limit
+        let blocked = false;
+        for (let bits = mask; bits && !blocked; bits &= bits - 1) {
+            const sub = mask ^ (bits & -bits);
+            blocked = sub !== 0 && !quotes[sub];
+        }
+        if (!blocked) quotes[mask] = compiled.quote(bL[mask], bW[mask], bH[mask], bKg[mask], false);
+    }
+
+    // best[mask]: cheapest way to ship the cartons in mask. Each step fixes the bundle that
+    // holds mask's lowest carton, so every partition is visited once; on equal cost the
+    // smaller bundle wins (fewer cartons strapped for no saving).
+    const best = new Float64Array(size).fill(Infinity);
+    const choice = new Int32Array(size);
+    best[0] = 0;
+    for (let mask = 1; mask < size; mask++) {
+        const low = mask & -mask, rest = mask ^ low;
+        for (let s = rest; ; s = (s - 1) & rest) {
+            const b = s | low, q = quotes[b];
+            if (q && q.cost <= best[mask]) {
+                const cost = q.cost + best[mask ^ b];
+                if (cost <= best[mask]) { best[mask] = cost; choice[mask] = b; }
+            }
+            if (s === 0) break;
+        }
+    }
+    if (!Number.isFinite(best[size - 1])) return null;
+
+    const bundles = [];
+    for (let mask = size - 1; mask; mask ^= choice[mask]) {
+        const b = choice[mask], members = [];
+        for (let i = 0; i < n; i++) if (b & (1 << i)) members.push(i);
+        bundles.push({ cartons: members, dims: [bL[b], bW[b], bH[b]], weight: bKg[b], courier: quotes[b] });
+    }
+    let separateCost = 0;
+    for (let i = 0; i < n; i++) separateCost += quotes[1 << i] ? quotes[1 << i].cost : Infinity;
+    return shipmentPlan(bundles, n, separateCost);
+}
+
+function shipmentPlan(bundles, n, separateCost) {
+    const cost = bundles.reduce((sum, b) => sum + b.courier.cost, 0);
+    if (separateCost === undefined) separateCost = cost;
+    const strategy = n === 1 ? 'single'
+        : bundles.length === 1 ? 'strapped'
+        : bundles.length === n ? 'separate' : 'mixed';
+    return {
+        cost,
+        parcels: bundles.reduce((sum, b) => sum + b.courier.parcels, 0),
+        strategy,
+        bundles,
+        separateCost,
+        savings: Number.isFinite(separateCost) ? separateCost - cost : 0
+    };
+}
+
+// Plan -> the courier object the views display. A single bundle reads like a normal
+// quote; several bundles become a split shipment with one detail entry per bundle.
+function shipmentCourier(plan) {
+    if (!plan) return null;
+    if (plan.strategy === 'single') return plan.bundles[0].courier;
+    if (plan.bundles.length === 1) return { ...plan.bundles[0].courier, strategy: plan.strategy, savings: plan.savings, plan };
+    return {
+        cost: plan.cost,
+        parcels: plan.parcels,
+        carrier: 'Split Shipment',
+        service: plan.bundles.map(b => b.courier.carrier).join(' + '),
+        strategy: plan.strategy,
+        savings: plan.savings,
+        details: plan.bundles.map(b => b.courier),
+        plan
+    };
+}
+
+// ========== CATALOG PRICING ==========
+// Prices rows [start, end) and picks their cheapest courier. Couriers are stored as the
+// index into the rules array plus cost/parcels so the result stays transferable.
+// Multi-carton rows (cols.cartons[i], with cols.vol holding the set's total CBM) get a
+// shipment plan instead, marked with SHIPMENT_PLAN_RULE.
+const SHIPMENT_PLAN_RULE = -2;
+
+function makeCatalogOutputs(n) {
+    const out = makePriceOutputs(n);
+    out.courierRule = new Int16Array(n);
+    out.courierCost = new Float64Array(n);
+    out.courierParcels = new Float64Array(n);
+    return out;
+}
+
+function priceCatalog(cols, p, courierRules, out, start = 0, end = cols.n) {
+    out = out || makeCatalogOutputs(cols.n);
+    priceBatch(cols, p, out, start, end);
+    const compiled = compileCourierRules(courierRules);
+    const { L, W, H, weight, cartons } = cols;
+    for (let i = start; i < end; i++) {
+        if (cartons && cartons[i]) {
+            const plan = planShipment(cartons[i], courierRules);
+            out.courierRule[i] = plan ? SHIPMENT_PLAN_RULE : -1;
+            out.courierCost[i] = plan ? plan.cost : NaN;
+            out.courierParcels[i] = plan ? plan.parcels : 0;
+            continue;
+        }
+        const c = L[i] > 0 && W[i] > 0 && H[i] > 0 ? compiled.quote(L[i], W[i], H[i], weight[i], false) : null;
+        out.courierRule[i] = c ? courierRules.findIndex(r => r.id === c.id) : -1;
+        out.courierCost[i] = c ? c.cost : NaN;
+        out.courierParcels[i] = c ? c.parcels : 0;
+    }
+    return out;
+}
+
+// Rebuild the courier object for a catalog row (only done for rows being displayed).
+function catalogCourier(cols, out, courierRules, i) {
+    const ruleIdx = out.courierRule[i];
+    if (ruleIdx === SHIPMENT_PLAN_RULE) return shipmentCourier(planShipment(cols.cartons[i], courierRules));
+    if (ruleIdx < 0 || !courierRules[ruleIdx]) return null;
+    const r = compileCourierRules(courierRules).rules.find(c => c.idx === ruleIdx);
+    const volumeL = (cols.L[i] | 0) * (cols.W[i] | 0) * (cols.H[i] | 0) / 1000;
+    return courierFit(r, out.courierCost[i], out.courierParcels[i], Math.max(0, cols.weight[i]), volumeL);
+}
+
+const emptyPriceStats = () => ({ total: 0, good: 0, review: 0, low: 0, marginSum: 0, totalProfit: 0, totalRevenue: 0 });
+
+// Adds (sign = 1) or removes (sign = -1) rows [start, end) from running totals.
+function accumulatePriceStats(stats, out, start, end, sign = 1) {
+    for (let i = start; i < end; i++) {
+        stats.total += sign;
+        if (out.status[i] === 0) stats.good += sign;
+        else if (out.status[i] === 1) stats.review += sign;
+        else stats.low += sign;
+        if (Number.isFinite(out.marginPct[i])) stats.marginSum += sign * out.marginPct[i];
+        if (Number.isFinite(out.profit[i])) stats.totalProfit += sign * out.profit[i];
+        if (Number.isFinite(out.sell[i])) stats.totalRevenue += sign * out.sell[i];
+    }
+    return stats;
+}
+
+// Re-price individual rows of an existing catalog result in place after their inputs
+// changed; stats move by the rows' delta instead of being recounted.
+function repriceCatalogRows(priced, p, courierRules, indices) {
+    for (const k of indices) {
+        if (k < 0 || k >= priced.cols.n) continue;
+        accumulatePriceStats(priced.stats, priced.out, k, k + 1, -1);
+        priceCatalog(priced.cols, p, courierRules, priced.out, k, k + 1);
+        accumulatePriceStats(priced.stats, priced.out, k, k + 1);
+    }
+    return priced;
+}
+
+function mergePriceStats(a, b) {
+    for (const k in b) a[k] += b[k];
+    return a;
+}
+
+// ========== LCL FREIGHT ==========
+// Less-than-container-load shipments are charged per W/M: the larger of CBM and tonnes.
+// Rates are all-units breakpoints ({ from, rate } by chargeable W/M; the whole shipment
+// takes the rate of the band it lands in), plus fixed fees per shipment and a minimum
+// charge. lcl params are plain data so they can travel to the pricing workers.
+const DEFAULT_LCL_TIERS = '0:85, 5:70, 15:60';
+
+// "0:85, 5:70, 15:60" (from W/M: £ per W/M) -> tiers sorted by breakpoint. A bare rate
+// starts at 0 W/M.
+const parseLclTiers = (text) => String(text || '').split(/[,;\n]+/)
+    .map(part => part.split(':').map(x => parseFloat(x)))
+    .map(([a, b]) => b === undefined ? { from: 0, rate: a } : { from: a, rate: b })
+    .filter(t => t.from >= 0 && t.rate > 0)
+    .sort((a, b) => a.from - b.from);
+
+// Settings -> lcl params (null when LCL is off or has no usable rates).
+const lclParams = (g) => {
+    if (!g?.lclEnabled) return null;
+    const tiers = parseLclTiers(g.lclTiers ?? DEFAULT_LCL_TIERS);
+    return tiers.length ? { tiers, fixed: Math.max(0, num(g.lclFixedGBP)), minCharge: Math.max(0, num(g.lclMinGBP)) } : null;
+};
+
+// W/M a carton (or set) is charged as.
+const chargeableWM = (vol, kg) => Math.max(vol, num(kg) / 1000);
+
+function lclCost(lcl, wm) {
+    if (!(wm > 0)) return 0;
+    const tiers = lcl.tiers;
+    let rate = tiers[0].rate;
+    for (let k = 1; k < tiers.length && wm >= tiers[k].from; k++) rate = tiers[k].rate;
+    return lcl.fixed + Math.max(lcl.minCharge, rate * wm);
+}
+
+// W/M from which LCL costs at least `fcl` and stays there: past it a container at that
+// price is always the cheaper way to ship. Within a band the cost rises linearly, but it
+// drops at each breakpoint (the whole shipment takes the lower rate), so LCL can climb past
+// `fcl` in one band and fall back under it in the next. Bands are solved directly, last
+// first: each earlier band's crossing counts only while the band after it is at or over
+// `fcl` from its start. Infinity if LCL never gets there.
+function lclCrossoverWM(lcl, fcl) {
+    const tiers = lcl.tiers, floor = lcl.fixed + lcl.minCharge >= fcl;
+    let from = Infinity;
+    for (let k = tiers.length - 1; k >= 0; k--) {
+        const lo = k ? tiers[k].from : 0, hi = k + 1 < tiers.length ? tiers[k + 1].from : Infinity;
+        const wm = floor ? lo : Math.max(lo, (fcl - lcl.fixed) / tiers[k].rate);
+        if (!(wm < hi && hi === from)) break;
+        from = wm;
+    }
+    return from;
+}
+
+// ========== ORDER CONSOLIDATION ==========
+// Packs a mixed-SKU order into the fewest containers and splits the freight bill by
+// chargeable share. lines: [{ qty, vol, weight }] with qty in cartons (or sets), vol CBM and
+// weight kg each. A container is full on volume or on payload, whichever comes first, so a
+// carton's chargeable size is the larger of its share of the two.
+// Packing is first-fit decreasing on chargeable size, placing each line's cartons as a run:
+// every open container takes as many as still fit before the next is tried, so the cost
+// is lines x containers rather than cartons x containers. Containers too full for the
+// smallest carton in the order are skipped from then on.
+function planConsolidation(lines, capacity, payloadKg = Infinity) {
+    const size = (l) => Math.max(l.vol / capacity, num(l.weight) / payloadKg);
+    const order = [];
+    for (let i = 0; i < lines.length; i++) if (lines[i].qty >= 1 && lines[i].vol > 0) order.push(i);
+    order.sort((a, b) => size(lines[b]) - size(lines[a]) || a - b);
+
+    const containers = [], oversize = [];
+    let minVol = Infinity, minKg = Infinity;
+    for (const i of order) {
+        minVol = Math.min(minVol, lines[i].vol);
+        minKg = Math.min(minKg, num(lines[i].weight));
+    }
+    let first = 0, totalCBM = 0, totalKg = 0, chargeable = 0;
+    const room = (free, freeKg, vol, kg) => Math.min(Math.floor((free + 1e-9) / vol), kg > 0 ? Math.floor((freeKg + 1e-9) / kg) : Infinity);
+    for (const i of order) {
+        const vol = lines[i].vol, kg = num(lines[i].weight);
+        let left = Math.floor(lines[i].qty);
+        const perBox = room(capacity, payloadKg, vol, kg);
+        if (!(perBox >= 1)) { oversize.push(i); continue; }
+        totalCBM += left * vol;
+        totalKg += left * kg;
+        chargeable += left * size(lines[i]);
+        while (first < containers.length && (containers[first].free < minVol - 1e-9 || containers[first].freeKg < minKg - 1e-9)) first++;
+        for (let c = first; c < containers.length && left > 0; c++) {
+            const box = containers[c];
+            const fit = Math.min(left, room(box.free, box.freeKg, vol, kg));
+            if (!fit) continue;
+            box.free -= fit * vol;
+            box.freeKg -= fit * kg;
+            box.lines.push([i, fit]);
+            left -= fit;
+        }
+        while (left > 0) {
+            const fit = Math.min(left, perBox);
+            containers.push({ free: capacity - fit * vol, freeKg: payloadKg - fit * kg, lines: [[i, fit]] });
+            left -= fit;
+        }
+    }
+    return {
+        capacity, payloadKg, count: containers.length, totalCBM, totalKg, chargeable, oversize,
+        containers: containers.map(c => ({
+            cbm: capacity - c.free, fillPct: (1 - c.free / capacity) * 100,
+            kg: payloadKg - c.freeKg, payloadPct: Number.isFinite(payloadKg) ? (1 - c.freeKg / payloadKg) * 100 : 0,
+            lines: c.lines
+        }))
+    };
+}
+
+// Consolidate the catalog rows that have an order quantity (cols.qty, cartons or sets) into
+// containers of p.effCBM and p.payloadKg. Each row's share of containers x p.sea follows
+// its chargeable share of the order; freight is the per-unit column priceBatch takes
+// (0 outside the order) and freightPerSea the same per £1 of p.sea (0 when it ships LCL).
+function consolidateCatalog(cols, p) {
+    const { n, qty, L, W, H, weight, pack } = cols;
+    const lines = new Array(n);
+    for (let i = 0; i < n; i++) {
+        const set = cols.cartons && cols.cartons[i];
+        lines[i] = {
+            qty: qty ? qty[i] : 0,
+            vol: cols.vol ? cols.vol[i] : (L[i] / 100) * (W[i] / 100) * (H[i] / 100),
+            weight: set ? cartonsKg(set) : weight[i]
+        };
+    }
+    const payloadKg = p.payloadKg > 0 ? p.payloadKg : Infinity;
+    const plan = planConsolidation(lines, p.effCBM, payloadKg);
+    plan.freight = plan.count * p.sea;
+    // an order small enough to ship LCL is charged (and split) by W/M instead
+    const skipped = new Set(plan.oversize);
+    const ordered = (l, i) => l.qty >= 1 && l.vol > 0 && !skipped.has(i);
+    plan.wm = 0;
+    lines.forEach((l, i) => { if (ordered(l, i)) plan.wm += Math.floor(l.qty) * chargeableWM(l.vol, l.weight); });
+    plan.lcl = !!p.lcl && plan.wm > 0 && lclCost(p.lcl, plan.wm) < plan.freight;
+    if (plan.lcl) plan.freight = lclCost(p.lcl, plan.wm);
+    const perShare = plan.lcl ? plan.freight / plan.wm : plan.chargeable > 0 ? plan.freight / plan.chargeable : 0;
+    plan.skus = 0;
+    const perShareSea = !plan.lcl && plan.chargeable > 0 ? plan.count / plan.chargeable : 0;
+    const freight = new Float64Array(n), freightPerSea = new Float64Array(n);
+    for (let i = 0; i < n; i++) {
+        const l = lines[i];
+        if (!ordered(l, i)) continue;
+        const share = plan.lcl ? chargeableWM(l.vol, l.weight) : Math.max(l.vol / p.effCBM, num(l.weight) / payloadKg);
+        const packs = pack[i] >= 1 ? pack[i] : 1;
+        freight[i] = share * perShare / packs;
+        freightPerSea[i] = share * perShareSea / packs;
+        plan.skus++;
+    }
+    return { plan, freight, freightPerSea };
+}
+
+// ========== CONTAINER SELECTION ==========
+// In 'auto' container mode an order ships in whichever mix of container types covers it
+// for the least freight, instead of being priced as a share of one full container; with
+// LCL on, the consolidated rate is weighed against it too. Each type's capacity is counted
+// in cartons the same way pricing counts them (3D loading or usable CBM). Every row is
+// independent, so a catalog is one pass.
+const CONTAINER_TYPES = ['40HQ', '40GP', '20GP'];
+const DEFAULT_CONTAINER_FREIGHT = { "40HQ": 2800, "40GP": 2600, "20GP": 1800 };
+
+// Cheapest way to ship `cartons` given caps[t] cartons and rates[t] freight per container
+// of type t. Branch and bound over the count of each type, best freight per carton first:
+// the cartons still uncovered cost at least that many times the best remaining rate per
+// carton, which prunes almost every branch. Ties go to fewer containers.
+// Returns { counts, cost } or null if nothing fits.
+function cheapestContainerMix(cartons, caps, rates) {
+    const order = [];
+    for (let t = 0; t < caps.length; t++) if (caps[t] > 0) order.push(t);
+    if (!order.length || !(cartons > 0)) return null;
+    order.sort((a, b) => rates[a] / caps[a] - rates[b] / caps[b]);
+    const perCarton = order.map(t => rates[t] / caps[t]);
+    const last = order.length - 1;
+    const counts = new Array(caps.length).fill(0);
+    let best = null;
+
+    const visit = (d, left, cost, boxes) => {
+        const t = order[d];
+        for (let c = Math.ceil(left / caps[t]); c >= 0; c--) {
+            const rest = Math.max(0, left - c * caps[t]);
+            const spent = cost + c * rates[t];
+            if (d === last && rest > 0) break;
+            if (best && spent + (d < last ? rest * perCarton[d + 1] : 0) > best.cost + 1e-9) continue;
+            counts[t] = c;
+            if (rest > 0) visit(d + 1, rest, spent, boxes + c);
+            else if (!best || spent < best.cost - 1e-9 || boxes + c < best.boxes) best = { counts: counts.slice(), cost: spent, boxes: boxes + c };
+        }
+        counts[t] = 0;
+    };
+    visit(0, cartons, 0, 0);
+    return { counts: best.counts, cost: best.cost };
+}
+
+// Shipping choice for rows [start, end), written into sel (allocated when omitted). Rows with
+// an order quantity (cols.qty, cartons or sets) ship in the cheapest container mix of
+// p.containers (or the fixed container type), or LCL when p.lcl is on and cheaper. Each
+// type's capacity is capped by its payload as in priceBatch. sel holds per-unit freight for
+// priceBatch, the mix as counts per type (row-major), its cost and whether it went LCL;
+// rows outside the order get 0. freightPerSea is the per-unit freight per £1 of p.sea for
+// rows shipped in the fixed container type (0 for LCL and auto mixes, whose rates are
+// their own). With LCL on, fclFrom is every row's crossover: the carton count from which
+// one container always beats LCL (0 if LCL stays cheaper up to a full one).
+function selectContainers(cols, p, sel, start = 0, end = cols.n) {
+    const types = p.containers || [{ type: p.containerType, effCBM: p.effCBM, payloadKg: p.payloadKg, sea: p.sea }];
+    const k = types.length, lcl = p.lcl;
+    sel = sel || {
+        types: types.map(t => t.type), freight: new Float64Array(cols.n), freightPerSea: new Float64Array(cols.n), cost: new Float64Array(cols.n),
+        counts: new Uint16Array(cols.n * k), lcl: new Uint8Array(cols.n), wm: new Float64Array(cols.n), fclFrom: new Float64Array(cols.n)
+    };
+    const { qty, L, W, H, pack } = cols;
+    const rates = types.map(t => t.sea), caps = new Array(k);
+    const crossWM = lcl ? rates.map(rate => lclCrossoverWM(lcl, rate)) : null;
+    for (let i = start; i < end; i++) {
+        sel.freight[i] = 0;
+        sel.freightPerSea[i] = 0;
+        sel.cost[i] = 0;
+        sel.counts.fill(0, i * k, i * k + k);
+        sel.lcl[i] = 0;
+        sel.wm[i] = 0;
+        sel.fclFrom[i] = 0;
+        const cartons = qty ? Math.floor(qty[i]) : 0;
+        if (!(cartons >= 1) && !lcl) continue;
+        const vol = cols.vol ? cols.vol[i] : (L[i] / 100) * (W[i] / 100) * (H[i] / 100);
+        const set = cols.cartons && cols.cartons[i];
+        const load = p.loading && !set && L[i] > 0 && W[i] > 0 && H[i] > 0;
+        const kg = set ? cartonsKg(set) : cols.weight ? cols.weight[i] : 0;
+        for (let t = 0; t < k; t++) {
+            caps[t] = load ? containerLoad(types[t].type, L[i], W[i], H[i]).count : vol > 0 ? Math.floor(types[t].effCBM / vol) : 0;
+            if (kg > 0) caps[t] = Math.min(caps[t], Math.floor(types[t].payloadKg / kg));
+        }
+        const each = chargeableWM(vol, kg);
+        if (lcl && each > 0) {
+            let from = Infinity;
+            for (let t = 0; t < k; t++) {
+                const q = Math.max(1, Math.ceil(crossWM[t] / each - 1e-9));
+                if (q <= caps[t]) from = Math.min(from, q);
+            }
+            sel.fclFrom[i] = Number.isFinite(from) ? from : 0;
+        }
+        if (!(cartons >= 1)) continue;
+        const mix = cheapestContainerMix(cartons, caps, rates);
+        const lclTotal = lcl && each > 0 ? lclCost(lcl, cartons * each) : Infinity;
+        if (!mix && !Number.isFinite(lclTotal)) continue;
+        const useLcl = lclTotal < (mix ? mix.cost : Infinity);
+        const cost = useLcl ? lclTotal : mix.cost;
+        sel.freight[i] = cost / (cartons * (pack[i] >= 1 ? pack[i] : 1));
+        sel.cost[i] = cost;
+        if (useLcl) {
+            sel.lcl[i] = 1;
+            sel.wm[i] = cartons * each;
+        } else {
+            sel.counts.set(mix.counts, i * k);
+            if (!p.containers) sel.freightPerSea[i] = mix.counts[0] / (cartons * (pack[i] >= 1 ? pack[i] : 1));
+        }
+    }
+    return sel;
+}
+
+// "1× 40HQ + 1× 20GP" (or "LCL · 3.2 W/M") for row i of a selection.
+function describeContainerMix(sel, i) {
+    if (sel.lcl[i]) return `LCL · ${sel.wm[i].toFixed(1)} W/M`;
+    const k = sel.types.length, parts = [];
+    for (let t = 0; t < k; t++) if (sel.counts[i * k + t]) parts.push(`${sel.counts[i * k + t]}× ${sel.types[t]}`);
+    return parts.join(' + ');
+}
+
+// ========== SENSITIVITY ==========
+// Required sell and margin across a grid of FX rates, sea freight costs and target margins
+// for a whole catalog. Landed cost is affine in 1/fx and freight, and the required sell is
+// that cost times 1/(keep - M). So each row's net cost is worked out once per (fx, freight)
+// point, and every target margin is then a single multiply. Rounding follows priceBatch,
+// so a grid point at the current settings reproduces the priced catalog exactly.
+//
+// Cubes are Float32Arrays, row-major so one SKU's surface is contiguous:
+//   sell[((row * nM + m) * nF + f) * nS + s]   required sell at target margin m (snapped)
+//   margin[(row * nF + f) * nS + s]            margin % at the row's current sell price
+// totals hold catalog aggregates per grid point (additive, so partitions just sum).
+//
+// Ordered freight (cols.freight) moves along the sea axis only where it is a multiple of
+// the sea rate, given per unit per £1 of it in cols.freightPerSea (see consolidateCatalog
+// and selectContainers); LCL and auto-mix freight have their own rates and stay fixed.
+const linspace = (lo, hi, steps) => {
+    steps = Math.max(1, steps | 0);
+    if (steps === 1) return [lo];
+    return Array.from({ length: steps }, (_, k) => lo + (hi - lo) * k / (steps - 1));
+};
+
+function makeSensitivityCube(n, axes) {
+    const nF = axes.fx.length, nS = axes.sea.length, nM = axes.margin.length;
+    return {
+        n, axes, nF, nS, nM,
+        sell: new Float32Array(n * nM * nF * nS),
+        margin: new Float32Array(n * nF * nS),
+        totals: {
+            priced: new Float64Array(1),              // rows with a current sell price
+            profit: new Float64Array(nF * nS),        // total profit at current prices
+            marginSum: new Float64Array(nF * nS),     // sum of margin % at current prices
+            below: new Float64Array(nF * nS),         // rows under their target margin
+            sellRatioSum: new Float64Array(nM * nF * nS) // sum of required / current sell
+        }
+    };
+}
+
+// axes: { fx: [...], sea: [...], margin: [...] } (margin % values). Rows [start, end).
+// base is the catalog already priced under p (priced here when omitted).
+function priceSensitivity(cols, p, axes, cube, start = 0, end = cols.n, base = priceBatch(cols, p, null, start, end)) {
+    cube = cube || makeSensitivityCube(cols.n, axes);
+    const { nF, nS, nM, sell: sellCube, margin: marginCube, totals } = cube;
+    const invFx = axes.fx.map(fx => fx > 0 ? 1 / fx : 0), sea = axes.sea;
+    const comm = Math.max(0, p.commissionPct) / 100;
+    const keep = 1 - comm - p.vatRate / (1 + p.vatRate);
+    const invDenom = axes.margin.map(m => {
+        const d = keep - Math.max(0, Math.min(0.99, m / 100));
+        return d > 0 ? 1 / d : NaN;
+    });
+    const ppCharged = Math.max(0, p.ppCharged), ppIn = cols.ppCost, marginIn = cols.marginPct;
+    const freightIn = cols.freight, perSeaIn = cols.freightPerSea;
+    const snap = makeEndingSnap(p.ending);
+    const block = nM * nF * nS, plane = nF * nS;
+    const net = new Float64Array(plane);
+
+    for (let i = start; i < end; i++) {
+        const pack = cols.pack[i] >= 1 ? cols.pack[i] : 1;
+        const units = base.units[i];
+        const unitUSD = cols.unitUSD[i];
+        const ordered = freightIn && freightIn[i] > 0 ? freightIn[i] : 0;
+        const perSea = perSeaIn && perSeaIn[i] > 0 ? perSeaIn[i] : 0;
+        const c = (ppIn ? Math.max(0, ppIn[i]) : Math.max(0, p.ppCost)) - ppCharged;
+        for (let f = 0; f < nF; f++) {
+            const fob = unitUSD * invFx[f];
+            for (let s = 0; s < nS; s++) {
+                // scaled from the ordered figure where there is one, so the current sea rate
+                // reproduces priceBatch exactly
+                const freight = perSea ? (ordered && p.sea > 0 ? ordered * (sea[s] / p.sea) : perSea * sea[s])
+                    : ordered || (units > 0 ? sea[s] / units : 0);
+                const landedUnit = round2(fob + freight);
+                net[f * nS + s] = (pack > 1 ? round2(landedUnit * pack) : landedUnit) + c;
+            }
+        }
+
+        const off = i * block;
+        for (let m = 0; m < nM; m++) {
+            const k0 = off + m * plane, scale = invDenom[m];
+            for (let g = 0; g < plane; g++) sellCube[k0 + g] = net[g] * scale;
+        }
+        if (snap) snap.snapAll(sellCube, sellCube, off, off + block);
+
+        const sell0 = base.sell[i];
+        const mOff = i * plane;
+        if (!(sell0 > 0)) {
+            marginCube.fill(NaN, mOff, mOff + plane);
+            continue;
+        }
+        totals.priced[0]++;
+        const target = marginIn ? marginIn[i] : p.marginPct;
+        const inv0 = 1 / sell0, kept = sell0 * keep;
+        for (let g = 0; g < plane; g++) {
+            const profit = kept - net[g];
+            const marginPct = profit * inv0 * 100;
+            marginCube[mOff + g] = marginPct;
+            totals.profit[g] += profit;
+            totals.marginSum[g] += marginPct;
+            if (marginPct < target - 1e-9) totals.below[g]++;
+        }
+        for (let k = 0; k < block; k++) {
+            const x = sellCube[off + k];
+            if (x === x) totals.sellRatioSum[k] += x * inv0;
+        }
+    }
+    return cube;
+}
+
+function mergeSensitivityTotals(a, b) {
+    for (const k in b) for (let i = 0; i < b[k].length; i++) a[k][i] += b[k][i];
+    return a;
+}
+
+if (typeof module !== 'undefined' && module.exports) {
+    module.exports = {
+        CONTAINER_CBM, CONTAINER_PAYLOAD_KG, VAT_RATE, VOL_DIVISOR, DX_SURCHARGE_THRESHOLD, DEFAULT_COURIER_RULES,
+        num, numOr, round2, cbm, vatComponent, requiredSellForMargin, maxPurchaseForMargin, computeProfit,
+        CONTAINER_DIMS, containerLoad,
+        DEFAULT_ENDINGS, parseEndings, priceRuleSpec, compileEndingSnapper, endingSnapper, makeEndingSnap, applyPriceRule,
+        PRICE_STATUS, REVIEW_MARGIN_PCT, pricingParams, makePriceColumns, makePriceOutputs, priceBatch,
+        compileCourierRules, chooseCourier, getAllCouriers, courierCacheStats, resetCourierCache,
+        MAX_PLAN_CARTONS, cartonsCBM, cartonsKg, planShipment, shipmentCourier, SHIPMENT_PLAN_RULE,
+        planConsolidation, consolidateCatalog,
+        DEFAULT_LCL_TIERS, parseLclTiers, lclParams, chargeableWM, lclCost, lclCrossoverWM,
+        CONTAINER_TYPES, DEFAULT_CONTAINER_FREIGHT, cheapestContainerMix, selectContainers, describeContainerMix,
+        linspace, makeSensitivityCube, priceSensitivity, mergeSensitivityTotals,
+        makeCatalogOutputs, priceCatalog, catalogCourier, emptyPriceStats, accumulatePriceStats, repriceCatalogRows, mergePriceStats
+    };
+}
@@ -0,0 +1,64 @@
+// Pricing worker: runs the batch pricing kernel over one partition of the catalog.
+// Driven by WorkerPool (lib/worker-pool.js); columns arrive as transferred typed arrays
+// and results go back the same way.
+importScripts('pricing-engine.js');
+
+const CHUNK_ROWS = 2048;
+let cancelledJob = 0;
+
+const isCancelled = (jobId) => jobId <= cancelledJob;
+const nextTick = () => new Promise(resolve => setTimeout(resolve, 0));
+
+const transferList = (obj) => Object.values(obj).filter(v => ArrayBuffer.isView(v)).map(v => v.buffer);
+
+const handlers = {
+    // { cols, params, courierRules } -> { out, stats }. Works in chunks so a cancel
+    // message for this job can be picked up between them.
+    async price({ jobId, cols, params, courierRules }) {
+        const out = makeCatalogOutputs(cols.n);
+        const stats = emptyPriceStats();
+        for (let start = 0; start < cols.n; start += CHUNK_ROWS) {
+            if (isCancelled(jobId)) return null;
+            const end = Math.min(cols.n, start + CHUNK_ROWS);
+            priceCatalog(cols, params, courierRules, out, start, end);
+            accumulatePriceStats(stats, out, start, end);
+            if (end < cols.n) await nextTick();
+        }
+        return { result: { out, stats }, transfer: transferList(out) };
+    },
+
+    // { cols, params, axes } -> sensitivity cube for this partition (see priceSensitivity).
+    async sensitivity({ jobId, cols, params, axes }) {
+        const cube = makeSensitivityCube(cols.n, axes);
+        const base = priceBatch(cols, params);
+        const perRow = cube.nM * cube.nF * cube.nS;
+        const chunk = Math.max(16, Math.floor(CHUNK_ROWS * 64 / perRow));
+        for (let start = 0; start < cols.n; start += chunk) {
+            if (isCancelled(jobId)) return null;
+            const end = Math.min(cols.n, start + chunk);
+            priceSensitivity(cols, params, axes, cube, start, end, base);
+            if (end < cols.n) await nextTick();
+        }
+        return { result: cube, transfer: [cube.sell.buffer, cube.margin.buffer, ...transferList(cube.totals)] };
+    }
+};
+
+self.onmessage = async (e) => {
+    const msg = e.data;
+    if (msg.type === 'cancel') {
+        cancelledJob = Math.max(cancelledJob, msg.jobId);
+        return;
+    }
+    const handler = handlers[msg.type];
+    if (!handler) {
+        self.postMessage({ taskId: msg.taskId, error: `Unknown task type: ${msg.type}` });
+        return;
+    }
+    try {
+        const reply = await handler(msg);
+        if (!reply) self.postMessage({ taskId: msg.taskId, result: null });
+        else self.postMessage({ taskId: msg.taskId, result: reply.result }, reply.transfer || []);
+    } catch (err) {
+        self.postMessage({ taskId: msg.taskId, error: err.message || String(err) });
+    }
+};
@@ -0,0 +1,255 @@
+// Quote sheet extraction, shared by the page and the Cloud Function (copied into
+// functions/shared/ by sync_shared.js). quoteProductRows is the one row -> product extractor:
+// the function's extractProductBatches wraps it with batching and image association, and the
+// page calls extractQuoteProducts for a sheet whose column mapping is already known, so it is
+// extracted without a round trip and exactly as the function would. templateFingerprint
+// identifies a supplier's sheet layout so that mapping can be recognised on the next upload,
+// and scoreProductSheet picks out the sheets of a workbook that hold a product table.
+
+// lib/dims.js is loaded ahead of this file in the page; under node it's required.
+const quoteDims = typeof module !== 'undefined' && module.exports ? require('./dims.js') : self;
+
+const QUOTE_NUMBER_STRIP = /[^0-9.-]/g;
+const QUOTE_DIMS_TRIPLE = /^\s*\d+(?:\.\d+)?\s*[x×*]\s*\d+(?:\.\d+)?\s*[x×*]\s*\d+(?:\.\d+)?/i;
+const QUOTE_NUMERIC = /^[\s$€£¥]*[-+]?(?:\d{1,3}(?:,\d{3})+|\d*)(?:\.\d+)?\s*$/;
+
+const quoteCell = (row, col) => String(row[col] || '');
+const quoteNumber = (s) => parseFloat(String(s).replace(QUOTE_NUMBER_STRIP, ''));
+
+// rows: [[cell, ...]] as sent to analyzeQuoteSheetV2; mapping: { field: { col, name, unit } }.
+// Data starts on the row after headerRow. Returns the products.
+function extractQuoteProducts(rows, mapping, headerRow) {
+    const products = [];
+    for (const { product } of quoteProductRows(rows, mapping, headerRow)) products.push(product);
+    return products;
+}
+
+// The same, lazily: yields { row, product } per product, row being its index among the data
+// rows (sheet row headerRow + 1 + row), for callers that place images or batch the output.
+function* quoteProductRows(rows, mapping, headerRow) {
+    const m = mapping || {};
+    const col = (field) => (m[field] && m[field].col != null ? m[field].col : null);
+    const dataRows = rows.slice(headerRow + 1);
+
+    // Dimension columns are parsed whole; each L/W/H group shares one inferred unit, all in cm
+    const dimsGroup = (fields) => {
+        const columns = fields.map(f => (col(f) != null ? dataRows.map(r => (r ? r[col(f)] : '')) : null));
+        const lead = fields.find((f, k) => columns[k]);
+        if (!lead) return [];
+        const unit = quoteDims.inferDimsUnitAcross(columns.filter(Boolean), m[lead].unit || m[lead].name);
+        return columns.map(values => values && quoteDims.parseDimsColumn(values, { unit }));
+    };
+    const [productDims, productWidths, productHeights] = dimsGroup(['productLength', 'productWidth', 'productHeight']);
+    const [cartonDims, cartonWidths, cartonHeights] = dimsGroup(['cartonLength', 'cartonWidth', 'cartonHeight']);
+
+    for (let i = 0; i < dataRows.length; i++) {
+        const row = dataRows[i];
+        if (!row || !row.some(c => c && String(c).trim())) continue;
+
+        const product = {
+            sku: '', title: '', unitPrice: 0,
+            productLength: 0, productWidth: 0, productHeight: 0, productSource: '',
+            cartonLength: 0, cartonWidth: 0, cartonHeight: 0, cartonSource: '',
+            pack: 1, pack_text: '', totalCartons: null,
+            grossWeight: 0, netWeight: null, weightUnit: 'kg',
+            supplierCBM: null, cbmSource: '',
+            dims_text: '',
+            image: null, imageUrl: null
+        };
+
+        const skuCol = col('sku');
+        if (skuCol != null) product.sku = quoteCell(row, skuCol).trim();
+        if (!product.sku) {
+            for (let c = 0; c < row.length; c++) {
+                const v = String(row[c] || '').trim();
+                if (v && (/^[A-Z]{2,5}\d+/.test(v) || /^[A-Z0-9-]{4,15}$/.test(v) || /^\d{4,10}$/.test(v))) {
+                    product.sku = v;
+                    break;
+                }
+            }
+        }
+
+        const titleCol = col('title');
+        if (titleCol != null) product.title = quoteCell(row, titleCol).trim();
+        if (!product.title) {
+            let longest = '';
+            for (let c = 0; c < row.length; c++) {
+                const v = String(row[c] || '').trim();
+                if (v.length > longest.length && v.length > 10 &&
+                    !/^\d+(\.\d+)?$/.test(v) && !/^\d+x\d+x\d+/.test(v) &&
+                    !/^[A-Z]{2,5}\d+$/.test(v) && !/^\d+\s*(PC|PCS|SET|KG|G|CM|MM)$/i.test(v)) {
+                    longest = v;
+                }
+            }
+            if (longest) product.title = longest;
+        }
+
+        const priceCol = col('price');
+        if (priceCol != null) product.unitPrice = quoteNumber(quoteCell(row, priceCol)) || 0;
+        if (product.unitPrice === 0) {
+            for (let c = 0; c < row.length; c++) {
+                const v = String(row[c] || '').trim();
+                if (v && (/^\$?\d+(\.\d{1,2})?$/.test(v) || /^\d+[.,]\d{2}$/.test(v) || /^USD?\s*\d+(\.\d{1,2})?/.test(v))) {
+                    const price = quoteNumber(v);
+                    if (price > 0 && price < 10000) { product.unitPrice = price; break; }
+                }
+            }
+        }
+
+        if (productDims) {
+            product.productLength = productDims.L[i];
+            if (productDims.count[i] >= 3) {
+                product.productWidth = productDims.W[i];
+                product.productHeight = productDims.H[i];
+                product.productSource = m.productLength.name || '';
+            } else {
+                product.productWidth = productWidths ? productWidths.L[i] : 0;
+                product.productHeight = productHeights ? productHeights.L[i] : 0;
+            }
+        }
+
+        // Carton dims: a combined "LxWxH" string in the length column wins over separate columns
+        const cartonLengthCol = col('cartonLength');
+        let combined = false;
+        if (cartonDims) {
+            product.cartonLength = cartonDims.L[i];
+            if (cartonDims.count[i] >= 3) {
+                product.cartonWidth = cartonDims.W[i];
+                product.cartonHeight = cartonDims.H[i];
+                product.cartonSource = m.cartonLength.name || '';
+                combined = true;
+            }
+        }
+        if (!combined && cartonWidths && col('cartonWidth') !== cartonLengthCol && cartonWidths.L[i] > 0) product.cartonWidth = cartonWidths.L[i];
+        if (!combined && cartonHeights && col('cartonHeight') !== cartonLengthCol && cartonHeights.L[i] > 0) product.cartonHeight = cartonHeights.L[i];
+
+        const dimsTextCol = col('dims_text');
+        if (dimsTextCol != null) product.dims_text = quoteCell(row, dimsTextCol);
+
+        const packCol = col('pack');
+        if (packCol != null) {
+            const packStr = quoteCell(row, packCol);
+            product.pack_text = packStr;
+            const match = packStr.toUpperCase().match(/(\d+)\s*(PC|PCS|SET|PACK|PIECE)/);
+            const any = match ? null : packStr.match(/\d+/);
+            product.pack = match ? parseInt(match[1]) : any ? parseInt(any[0]) : 1;
+        }
+
+        const totalCartonsCol = col('totalCartons');
+        if (totalCartonsCol != null) product.totalCartons = parseInt(String(row[totalCartonsCol]).replace(/[^0-9]/g, '')) || null;
+
+        const grossWeightCol = col('grossWeight');
+        if (grossWeightCol != null) {
+            product.grossWeight = quoteNumber(quoteCell(row, grossWeightCol)) || 0;
+            product.weightUnit = m.grossWeight.unit || 'kg';
+        }
+        const netWeightCol = col('netWeight');
+        if (netWeightCol != null) product.netWeight = quoteNumber(quoteCell(row, netWeightCol)) || null;
+
+        const supplierCBMCol = col('supplierCBM');
+        if (supplierCBMCol != null) {
+            product.supplierCBM = quoteNumber(quoteCell(row, supplierCBMCol)) || null;
+            product.cbmSource = m.supplierCBM.name || '';
+        }
+
+        const hasDims = (product.productLength && product.productWidth) || (product.cartonLength && product.cartonWidth);
+        if (product.sku || product.unitPrice > 0 || hasDims) yield { row: i, product };
+    }
+}
+
+// Two FNV-1a passes with different offsets, as 16 hex chars.
+function quoteHash(text) {
+    let a = 0x811c9dc5, b = 0x01000193 ^ 0x5bd1e995;
+    for (let i = 0; i < text.length; i++) {
+        const c = text.charCodeAt(i);
+        a = Math.imul(a ^ c, 0x01000193);
+        b = Math.imul(b ^ c, 0x01000193);
+    }
+    return (a >>> 0).toString(16).padStart(8, '0') + (b >>> 0).toString(16).padStart(8, '0');
+}
+
+// Per-cell type for the layout signature: e(mpty), d(ims "LxWxH"), n(umber) or t(ext).
+function quoteCellType(v) {
+    const s = v == null ? '' : String(v).trim();
+    if (!s) return 'e';
+    if (QUOTE_DIMS_TRIPLE.test(s)) return 'd';
+    return QUOTE_NUMERIC.test(s) && /\d/.test(s) ? 'n' : 't';
+}
+
+const normalizeHeaderCell = (v) => String(v == null ? '' : v).toLowerCase().replace(/\s+/g, ' ').trim();
+
+// Fingerprint of the layout with its header on rows[headerRow]: the normalized header text,
+// the column count and, per column, the commonest non-empty cell type over the next few data
+// rows. Cell values, row count and anything below the sample don't enter into it, so every
+// quote a supplier sends on the same template comes out the same. null if the row can't be
+// a header (fewer than two labels).
+function templateFingerprint(rows, headerRow, sampleRows = 5) {
+    const header = (rows[headerRow] || []).map(normalizeHeaderCell);
+    if (header.filter(Boolean).length < 2) return null;
+    const sample = [];
+    for (let i = headerRow + 1; i < rows.length && sample.length < sampleRows; i++) {
+        const row = rows[i];
+        if (row && row.some(c => c != null && String(c).trim())) sample.push(row);
+    }
+    let width = header.length;
+    for (const row of sample) width = Math.max(width, row.length);
+    while (width > 0 && !header[width - 1] && sample.every(r => quoteCellType(r[width - 1]) === 'e')) width--;
+
+    let types = '';
+    for (let c = 0; c < width; c++) {
+        const tally = { d: 0, n: 0, t: 0 };
+        for (const row of sample) {
+            const t = quoteCellType(row[c]);
+            if (t !== 'e') tally[t]++;
+        }
+        const best = Object.keys(tally).reduce((x, y) => (tally[y] > tally[x] ? y : x), 'd');
+        types += tally[best] ? best : 'e';
+    }
+    return quoteHash([headerRow, width, types, header.slice(0, width).join('␟')].join('␞'));
+}
+
+// Fingerprints for every row that could be the header, nearest the top first, as
+// [{ headerRow, key }]. Lookups try these before asking the model; maxHeaderRow matches the
+// clamp analyzeQuoteSheetV2 puts on the header row it's given.
+function templateCandidates(rows, maxHeaderRow = 20) {
+    const out = [];
+    for (let r = 0; r <= maxHeaderRow && r < rows.length; r++) {
+        const key = templateFingerprint(rows, r);
+        if (key) out.push({ headerRow: r, key });
+    }
+    return out;
+}
+
+// Header words a product/price table has; each matching cell is one hit.
+const QUOTE_HEADER_WORDS = /\b(sku|item|model|code|art|ref|description|product|name|price|fob|usd|cost|qty|moq|pack|packing|pcs|carton|ctn|size|dimensions?|meas|cbm|weight|g\.?w|n\.?w|kg)\b/i;
+
+// How much a sheet looks like a product table: the row in the top maxHeaderRow with the most
+// header-word cells, and how many rows below it hold a number next to other values. Returns
+// { score, headerRow, hits, dataRows }; a sheet needs two header hits and a data row to be a
+// candidate at all (score 0 otherwise). Terms, notes and cover sheets score 0 or low.
+function scoreProductSheet(rows, maxHeaderRow = 20, sampleRows = 200) {
+    let headerRow = 0, hits = 0;
+    for (let r = 0; r <= maxHeaderRow && r < rows.length; r++) {
+        let n = 0;
+        for (const v of rows[r] || []) if (v != null && QUOTE_HEADER_WORDS.test(String(v))) n++;
+        if (n > hits) { hits = n; headerRow = r; }
+    }
+    let dataRows = 0;
+    const end = Math.min(rows.length, headerRow + 1 + sampleRows);
+    for (let r = headerRow + 1; r < end; r++) {
+        let filled = 0, numeric = false;
+        for (const v of rows[r] || []) {
+            const t = quoteCellType(v);
+            if (t === 'e') continue;
+            filled++;
+            if (t !== 't') numeric = true;
+        }
+        if (filled >= 2 && numeric) dataRows++;
+    }
+    const score = hits >= 2 && dataRows ? hits * 10 + dataRows : 0;
+    return { score, headerRow, hits, dataRows };
+}
+
+if (typeof module !== 'undefined' && module.exports) {
+    module.exports = { extractQuoteProducts, quoteProductRows, templateFingerprint, templateCandidates, scoreProductSheet };
+}
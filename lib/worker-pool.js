@@ -0,0 +1,114 @@
+// Fixed-size pool of dedicated workers running one script. A job is a list of tasks
+// (one message each); tasks are handed to idle workers and the job resolves with the
+// task results in order. Starting a job on a channel cancels the previous job on that
+// channel: its queued tasks are dropped, running workers are told to stop, and its
+// promise resolves with null so callers can ignore stale results.
+//
+// Worker side contract: messages arrive as { taskId, jobId, ...task.message } and
+// { type: 'cancel', jobId }; replies are { taskId, result } or { taskId, error }. A task may
+// send any number of { taskId, progress } messages before its reply; they go to the job's
+// onProgress(index, progress) and leave the worker busy.
+
+function WorkerPool(url, size) {
+    this.url = url;
+    this.size = Math.max(1, size || 1);
+    this.workers = [];
+    this.idle = [];
+    this.queue = [];
+    this.tasks = new Map();
+    this.channels = new Map();
+    this.nextId = 1;
+}
+
+WorkerPool.supported = typeof Worker !== 'undefined' && typeof location !== 'undefined' && location.protocol !== 'file:';
+
+WorkerPool.defaultSize = () => Math.max(1, Math.min(4, ((typeof navigator !== 'undefined' && navigator.hardwareConcurrency) || 2) - 1));
+
+WorkerPool.prototype._spawn = function () {
+    const worker = new Worker(this.url);
+    worker.onmessage = (e) => this._settle(worker, e.data);
+    worker.onerror = (e) => {
+        e.preventDefault();
+        this._settle(worker, { taskId: worker.taskId, error: e.message || 'Worker error' });
+    };
+    this.workers.push(worker);
+    return worker;
+};
+
+WorkerPool.prototype._pump = function () {
+    while (this.queue.length) {
+        let worker = this.idle.pop();
+        if (!worker && this.workers.length < this.size) worker = this._spawn();
+        if (!worker) return;
+        const task = this.queue.shift();
+        worker.taskId = task.taskId;
+        worker.postMessage({ taskId: task.taskId, jobId: task.job.id, ...task.message }, task.transfer || []);
+    }
+};
+
+WorkerPool.prototype._settle = function (worker, data) {
+    const task = this.tasks.get(data.taskId);
+    if (data.progress !== undefined && !data.error) {
+        if (task && !task.job.cancelled && task.job.onProgress) task.job.onProgress(task.index, data.progress);
+        return;
+    }
+    worker.taskId = null;
+    this.idle.push(worker);
+    if (task) {
+        this.tasks.delete(data.taskId);
+        const job = task.job;
+        if (!job.cancelled) {
+            if (data.error) {
+                job.cancelled = true;
+                if (this.channels.get(job.channel) === job) this.channels.delete(job.channel);
+                job.reject(new Error(data.error));
+            } else {
+                job.results[task.index] = data.result;
+                if (--job.pending === 0) {
+                    if (this.channels.get(job.channel) === job) this.channels.delete(job.channel);
+                    job.resolve(job.results);
+                }
+            }
+        }
+    }
+    this._pump();
+};
+
+// tasks: [{ message, transfer }]. Resolves with [result, ...] or null if superseded.
+WorkerPool.prototype.run = function (channel, tasks, onProgress) {
+    this.cancel(channel);
+    const job = { id: this.nextId++, channel, cancelled: false, pending: tasks.length, results: new Array(tasks.length), onProgress };
+    const promise = new Promise((resolve, reject) => { job.resolve = resolve; job.reject = reject; });
+    if (!tasks.length) { job.resolve([]); return promise; }
+    this.channels.set(channel, job);
+    tasks.forEach((t, index) => {
+        const taskId = this.nextId++;
+        const task = { taskId, index, job, message: t.message, transfer: t.transfer };
+        this.tasks.set(taskId, task);
+        this.queue.push(task);
+    });
+    this._pump();
+    return promise;
+};
+
+WorkerPool.prototype.cancel = function (channel) {
+    const job = this.channels.get(channel);
+    if (!job) return;
+    this.channels.delete(channel);
+    if (job.cancelled) return;
+    job.cancelled = true;
+    job.resolve(null);
+    this.queue = this.queue.filter(t => t.job !== job);
+    for (const worker of this.workers) {
+        const task = this.tasks.get(worker.taskId);
+        if (task && task.job === job) worker.postMessage({ type: 'cancel', jobId: job.id });
+    }
+};
+
+WorkerPool.prototype.terminate = function () {
+    for (const channel of [...this.channels.keys()]) this.cancel(channel);
+    this.workers.forEach(w => w.terminate());
+    this.workers = [];
+    this.idle = [];
+    this.tasks.clear();
+};
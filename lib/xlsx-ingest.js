@@ -0,0 +1,261 @@
+// Single-pass XLSX reader for imports. The zip directory is read once and only the parts an
+// import needs are inflated, each once: the workbook and its rels, shared strings, every
+// worksheet, their drawings and the media they anchor. The result is plain data - cell rows,
+// image anchors and media bytes - so the ingest worker can hand it back with the media
+// transferred. Inflates with DecompressionStream('deflate-raw'); no zip library needed.
+// Loaded by lib/ingest-worker.js and, for browsers without workers, by index.html.
+
+const ZIP_EOCD = 0x06054b50, ZIP_CENTRAL = 0x02014b50;
+
+const MEDIA_TYPES = { png: 'image/png', jpg: 'image/jpeg', jpeg: 'image/jpeg', gif: 'image/gif', bmp: 'image/bmp', webp: 'image/webp', emf: 'image/emf', wmf: 'image/wmf' };
+
+// name -> { method, size, local } from the zip central directory.
+function readZipDirectory(bytes) {
+    const view = new DataView(bytes.buffer, bytes.byteOffset, bytes.byteLength);
+    let eocd = -1;
+    for (let i = bytes.length - 22; i >= 0 && i >= bytes.length - 22 - 0xFFFF; i--) {
+        if (view.getUint32(i, true) === ZIP_EOCD) { eocd = i; break; }
+    }
+    if (eocd < 0) throw new Error('Not an XLSX workbook');
+    const names = new TextDecoder();
+    const entries = new Map();
+    let p = view.getUint32(eocd + 16, true);
+    for (let k = view.getUint16(eocd + 10, true); k > 0; k--) {
+        if (view.getUint32(p, true) !== ZIP_CENTRAL) throw new Error('Corrupt XLSX zip directory');
+        const nameLen = view.getUint16(p + 28, true);
+        entries.set(names.decode(bytes.subarray(p + 46, p + 46 + nameLen)), {
+            method: view.getUint16(p + 10, true),
+            size: view.getUint32(p + 20, true),
+            local: view.getUint32(p + 42, true)
+        });
+        p += 46 + nameLen + view.getUint16(p + 30, true) + view.getUint16(p + 32, true);
+    }
+    return entries;
+}
+
+// Entry bytes as a fresh Uint8Array (its own buffer, so it can be transferred).
+async function inflateZipEntry(bytes, entry) {
+    const view = new DataView(bytes.buffer, bytes.byteOffset, bytes.byteLength);
+    const start = entry.local + 30 + view.getUint16(entry.local + 26, true) + view.getUint16(entry.local + 28, true);
+    const data = bytes.subarray(start, start + entry.size);
+    if (entry.method === 0) return data.slice();
+    if (entry.method !== 8) throw new Error(`Unsupported XLSX compression (method ${entry.method})`);
+    const stream = new Blob([data]).stream().pipeThrough(new DecompressionStream('deflate-raw'));
+    return new Uint8Array(await new Response(stream).arrayBuffer());
+}
+
+const XML_ENTITIES = { lt: '<', gt: '>', amp: '&', quot: '"', apos: "'" };
+
+const xmlText = (s) => s.replace(/&(#x[0-9a-f]+|#\d+|\w+);/gi, (m, e) =>
+    e[0] !== '#' ? (XML_ENTITIES[e] ?? m) : String.fromCodePoint(e[1] === 'x' || e[1] === 'X' ? parseInt(e.slice(2), 16) : parseInt(e.slice(1), 10)));
+
+const xmlAttr = (attrs, name) => {
+    const m = attrs.match(new RegExp(`(?:^|\\s)${name}=(["'])(.*?)\\1`));
+    return m ? xmlText(m[2]) : null;
+};
+
+// Text of every <t> run, skipping phonetic (<rPh>) runs.
+const xmlRuns = (xml) => {
+    let text = '';
+    const re = /<(?:\w+:)?t(?:\s[^>]*)?>([\s\S]*?)<\/(?:\w+:)?t>/g;
+    const body = xml.replace(/<(?:\w+:)?rPh\b[\s\S]*?<\/(?:\w+:)?rPh>/g, '');
+    for (let m; (m = re.exec(body));) text += m[1];
+    return xmlText(text);
+};
+
+// "xl/worksheets/sheet1.xml" + "../drawings/drawing1.xml" -> "xl/drawings/drawing1.xml"
+const resolvePart = (base, target) => {
+    if (target[0] === '/') return target.slice(1);
+    const parts = base.split('/').slice(0, -1);
+    for (const seg of target.split('/')) {
+        if (seg === '..') parts.pop();
+        else if (seg !== '.') parts.push(seg);
+    }
+    return parts.join('/');
+};
+
+const relsPath = (part) => {
+    const slash = part.lastIndexOf('/');
+    return `${part.slice(0, slash + 1)}_rels/${part.slice(slash + 1)}.rels`;
+};
+
+const SHEET_TAG = /<(\w+:)?(row|c)\b([^>]*?)(\/?)>/g;
+
+// Value of a one-letter attribute (r, t) in a row or cell tag's attribute text, or null.
+// These only ever hold plain tokens, so there is nothing to unescape.
+const tagAttr = (attrs, name) => {
+    for (let at = attrs.indexOf(name + '="'); at >= 0; at = attrs.indexOf(name + '="', at + 1)) {
+        const before = attrs.charCodeAt(at - 1);
+        if (at === 0 || before === 32 || before === 9 || before === 10 || before === 13) return attrs.slice(at + 3, attrs.indexOf('"', at + 3));
+    }
+    return null;
+};
+
+// "AB12" -> 27 (0-based column index)
+const columnIndex = (ref) => {
+    let col = 0;
+    for (let i = 0; i < ref.length; i++) {
+        const c = ref.charCodeAt(i) & ~32;
+        if (c < 65 || c > 90) break;
+        col = col * 26 + c - 64;
+    }
+    return col - 1;
+};
+
+// Sheet XML -> dense rows of cell values (string | number | boolean), '' for empty cells.
+// Scans <row> and <c> tags in one pass and jumps straight to each cell's closing tag.
+function parseSheetRows(xml, strings) {
+    const rows = [];
+    let row = null, nextRow = 0, nextCol = 0, ns = '', cClose = '</c>', vOpen = '<v>', vClose = '</v>';
+    const re = SHEET_TAG;
+    re.lastIndex = Math.max(0, xml.indexOf('sheetData'));
+    for (let m; (m = re.exec(xml));) {
+        const attrs = m[3];
+        if ((m[1] || '') !== ns) {
+            ns = m[1] || '';
+            cClose = `</${ns}c>`; vOpen = `<${ns}v>`; vClose = `</${ns}v>`;
+        }
+        if (m[2] === 'row') {
+            const r = tagAttr(attrs, 'r');
+            const y = r ? parseInt(r, 10) - 1 : nextRow;
+            nextRow = y + 1;
+            nextCol = 0;
+            rows[y] = row = [];
+            continue;
+        }
+        const ref = tagAttr(attrs, 'r');
+        const x = ref ? columnIndex(ref) : nextCol;
+        nextCol = x + 1;
+        if (m[4] || !row) continue;
+        const close = xml.indexOf(cClose, re.lastIndex);
+        if (close < 0) break;
+        const body = xml.slice(re.lastIndex, close);
+        re.lastIndex = close + cClose.length;
+        const type = tagAttr(attrs, 't');
+        let value;
+        if (type === 'inlineStr') value = xmlRuns(body);
+        else {
+            const open = body.indexOf(vOpen);
+            if (open < 0) continue;
+            const v = body.slice(open + vOpen.length, body.indexOf(vClose, open));
+            if (type === 's') value = strings[+v] ?? '';
+            else if (type === 'b') value = v === '1';
+            else if (type === 'str' || type === 'e' || type === 'd') value = xmlText(v);
+            else {
+                const n = +v;
+                value = Number.isFinite(n) && v !== '' ? n : xmlText(v);
+            }
+        }
+        while (row.length < x) row.push('');
+        row[x] = value;
+    }
+    for (let y = 0; y < rows.length; y++) if (!rows[y]) rows[y] = [];
+    return rows;
+}
+
+// rels XML -> Map(id -> { type, target })
+const parseRels = (xml) => {
+    const rels = new Map();
+    const re = /<(?:\w+:)?Relationship\b([^>]*?)\/?>/g;
+    for (let m; (m = re.exec(xml));) {
+        rels.set(xmlAttr(m[1], 'Id'), { type: xmlAttr(m[1], 'Type') || '', target: xmlAttr(m[1], 'Target') || '', external: xmlAttr(m[1], 'TargetMode') === 'External' });
+    }
+    return rels;
+};
+
+// Drawing XML -> [{ row, col, width, height, embed }]: the top-left cell of each picture,
+// its span in cells and the rel id of its media.
+function parseDrawingAnchors(xml) {
+    const anchors = [];
+    const re = /<(?:\w+:)?(twoCellAnchor|oneCellAnchor)\b[\s\S]*?<\/(?:\w+:)?\1>/g;
+    const pos = (body, tag) => {
+        const m = body.match(new RegExp(`<(?:\\w+:)?${tag}>([\\s\\S]*?)</(?:\\w+:)?${tag}>`));
+        if (!m) return null;
+        const num = (t) => { const v = m[1].match(new RegExp(`<(?:\\w+:)?${t}>(\\d+)<`)); return v ? parseInt(v[1], 10) : 0; };
+        return { row: num('row'), col: num('col') };
+    };
+    for (let m; (m = re.exec(xml));) {
+        const blip = m[0].match(/<(?:\w+:)?blip\b[^>]*?\br:embed=(["'])(.*?)\1/);
+        const from = pos(m[0], 'from');
+        if (!blip || !from) continue;
+        const to = pos(m[0], 'to') || from;
+        anchors.push({ row: from.row, col: from.col, width: to.col - from.col, height: to.row - from.row, embed: blip[2] });
+    }
+    return anchors;
+}
+
+// XLSX bytes -> { sheets: [{ name, hidden, rows, images }], media: [{ path, extension, mime,
+// bytes }] } with every worksheet in workbook order (chart sheets are left out), plus
+// sheetName, sheetNames, rows and images of the first worksheet for single-sheet callers.
+// rows are dense (row index = sheet row - 1); images are [{ row, col, width, height, media }]
+// and media indexes the shared media list, which holds each picture once.
+async function readXlsxWorkbook(bytes) {
+    const entries = readZipDirectory(bytes);
+    const utf8 = new TextDecoder();
+    const readPart = async (path) => {
+        const entry = entries.get(path);
+        return entry ? utf8.decode(await inflateZipEntry(bytes, entry)) : null;
+    };
+
+    const workbook = await readPart('xl/workbook.xml');
+    if (workbook == null) throw new Error('Not an XLSX workbook');
+    const declared = [];
+    const sheetRe = /<(?:\w+:)?sheet\b([^>]*?)\/?>/g;
+    for (let m; (m = sheetRe.exec(workbook));) {
+        declared.push({ name: xmlAttr(m[1], 'name') || '', rid: xmlAttr(m[1], 'r:id'), hidden: /hidden/.test(xmlAttr(m[1], 'state') || '') });
+    }
+    if (!declared.length) throw new Error('Workbook has no sheets');
+    const bookRels = parseRels((await readPart(relsPath('xl/workbook.xml'))) || '');
+
+    const strings = [];
+    for (const [, rel] of bookRels) {
+        if (!rel.type.endsWith('/sharedStrings')) continue;
+        const xml = (await readPart(resolvePart('xl/workbook.xml', rel.target))) || '';
+        const re = /<(?:\w+:)?si>([\s\S]*?)<\/(?:\w+:)?si>|<(?:\w+:)?si\/>/g;
+        for (let m; (m = re.exec(xml));) strings.push(m[1] ? xmlRuns(m[1]) : '');
+    }
+
+    const media = [];
+    const mediaIndex = new Map(); // part path -> index in media
+    const sheets = [];
+    for (const [k, sheet] of declared.entries()) {
+        const rel = bookRels.get(sheet.rid);
+        if (rel && !rel.type.endsWith('/worksheet')) continue;
+        const sheetPath = rel ? resolvePart('xl/workbook.xml', rel.target) : `xl/worksheets/sheet${k + 1}.xml`;
+        const xml = await readPart(sheetPath);
+        if (xml == null) continue;
+        const rows = parseSheetRows(xml, strings);
+
+        const images = [];
+        const sheetRels = parseRels((await readPart(relsPath(sheetPath))) || '');
+        for (const [, sheetRel] of sheetRels) {
+            if (!sheetRel.type.endsWith('/drawing') || sheetRel.external) continue;
+            const drawingPath = resolvePart(sheetPath, sheetRel.target);
+            const drawing = await readPart(drawingPath);
+            if (!drawing) continue;
+            const drawingRels = parseRels((await readPart(relsPath(drawingPath))) || '');
+            for (const anchor of parseDrawingAnchors(drawing)) {
+                const target = drawingRels.get(anchor.embed);
+                if (!target || target.external) continue;
+                const path = resolvePart(drawingPath, target.target);
+                if (!mediaIndex.has(path)) {
+                    const entry = entries.get(path);
+                    if (!entry) continue;
+                    const extension = path.slice(path.lastIndexOf('.') + 1).toLowerCase();
+                    mediaIndex.set(path, media.length);
+                    media.push({ path, extension, mime: MEDIA_TYPES[extension] || 'application/octet-stream', bytes: await inflateZipEntry(bytes, entry) });
+                }
+                images.push({ row: anchor.row, col: anchor.col, width: anchor.width, height: anchor.height, media: mediaIndex.get(path) });
+            }
+        }
+        sheets.push({ name: sheet.name, hidden: sheet.hidden, rows, images });
+    }
+    if (!sheets.length) throw new Error('Workbook has no worksheets');
+
+    const first = sheets[0];
+    return { sheetName: first.name, sheetNames: sheets.map(s => s.name), rows: first.rows, images: first.images, sheets, media };
+}
+
+if (typeof module !== 'undefined' && module.exports) {
+    module.exports = { readZipDirectory, inflateZipEntry, parseSheetRows, parseDrawingAnchors, readXlsxWorkbook };
+}
@@ -0,0 +1,20 @@
+/**
+ * Copy the browser/worker modules the Cloud Function also uses into functions/shared/.
+ * Firebase only uploads the functions/ directory, so lib/ can't be required from there
+ * directly. Runs as the functions predeploy hook (firebase.json) and before the emulator;
+ * functions/shared/ is generated and gitignored.
+ */
+
+const fs = require("fs");
+const path = require("path");
+
+const SHARED = ["dims.js", "quote-extract.js"];
+
+const from = path.join(__dirname, "lib");
+const to = path.join(__dirname, "functions", "shared");
+
+fs.mkdirSync(to, { recursive: true });
+for (const name of SHARED) {
+  fs.copyFileSync(path.join(from, name), path.join(to, name));
+  console.log(`shared: lib/${name} -> functions/shared/${name}`);
+}
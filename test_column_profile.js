@@ -0,0 +1,27 @@
+/**
+ * Pasted-column role checks (assignColumnRoles in lib/column-profile.js): whole-number prices
+ * are read as prices, not pack sizes, while a real pack column beside them keeps its role.
+ * Run: node test_column_profile.js
+ */
+
+const { assignColumnRoles } = require("./lib/column-profile.js");
+
+let failures = 0;
+const check = (label, rows, expected) => {
+  const { roles } = assignColumnRoles(rows);
+  const got = Object.fromEntries(Object.entries(roles).map(([role, r]) => [role, r.col]));
+  const ok = Object.keys(expected).length === Object.keys(got).length &&
+    Object.entries(expected).every(([role, col]) => got[role] === col);
+  console.log(`${ok ? "PASS" : "FAIL"} ${label}${ok ? "" : ` (got ${JSON.stringify(got)})`}`);
+  if (!ok) failures++;
+};
+
+check("one column of whole-number prices", "12\n15\n20\n8\n30".split("\n").map(v => [v]), { price: 0 });
+check("whole-number prices beside dimensions",
+  Array.from({ length: 50 }, (_, i) => [String(i + 5), "60x40x30"]), { price: 0, dims: 1 });
+check("whole-number prices beside a pack column",
+  [["12", "6"], ["15", "6"], ["20", "12"], ["8", "12"], ["30", "6"]], { price: 0, pack: 1 });
+check("decimal prices beside a pack column",
+  [["12.50", "6"], ["15.20", "6"], ["20.10", "12"], ["8.99", "12"]], { price: 0, pack: 1 });
+
+if (failures) process.exitCode = 1;
@@ -0,0 +1,31 @@
+/**
+ * Dimension parsing checks (lib/dims.js): the formats suppliers write, decimal commas, and
+ * thousands separators in millimetre sizes. Values are in cm.
+ * Run: node test_dims.js
+ */
+
+const { parseDims } = require("./lib/dims.js");
+
+const CASES = [
+  ["60x45x35cm", [60, 45, 35]],
+  ["600*450*350MM", [60, 45, 35]],
+  ["L60 W45 H35", [60, 45, 35]],
+  ["60×45×35", [60, 45, 35]],
+  ["23,6 x 17,7 x 10,2", [23.6, 17.7, 10.2]],
+  ["0,6 x 0,45 x 0,35 m", [60, 45, 35]],
+  ["0,600 x 0,450 x 0,350 m", [60, 45, 35]],
+  ["60,45,35", [60, 45, 35]],
+  ["1,200x800x600mm", [120, 80, 60]],
+  ["1,200 x 1,000 x 1,500 mm", [120, 100, 150]],
+  ["2,400.5 x 800 x 600 mm", [240.05, 80, 60]]
+];
+
+let failures = 0;
+for (const [cell, want] of CASES) {
+  const got = parseDims(cell);
+  const ok = !!got && want.every((v, k) => Math.abs(got[k] - v) < 1e-9);
+  console.log(`${ok ? "PASS" : "FAIL"} ${cell}${ok ? "" : ` (got ${JSON.stringify(got)})`}`);
+  if (!ok) failures++;
+}
+
+if (failures) process.exitCode = 1;
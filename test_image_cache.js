@@ -0,0 +1,63 @@
+/**
+ * Product image cache checks (ImageCache in lib/image-renditions.js): photos whose sources
+ * alone are over the memory budget still keep their renditions, so rows that stay on screen
+ * render each image once instead of evicting one another.
+ * Run: node test_image_cache.js
+ */
+
+const { ImageCache } = require("./lib/image-renditions.js");
+
+const MB = 1024 * 1024;
+const N = 30;
+let failures = 0;
+
+const check = (label, ok) => {
+  console.log(`${ok ? "PASS" : "FAIL"} ${label}`);
+  if (!ok) failures++;
+};
+
+// Renditions are plain blobs of a thumbnail's and a preview's typical size
+const renders = new Map();
+const render = async (key, blob, sizes) => {
+  renders.set(key, (renders.get(key) || 0) + 1);
+  return { renditions: sizes.map(px => new Blob([new Uint8Array(px * 80)])) };
+};
+
+// What a mounted row does (useProductImage): show the URL if it's there, else load it
+const show = async (cache, key) => cache.url(key, "thumb") || cache.load(key, "thumb");
+
+async function testImageCache() {
+  const cache = new ImageCache({ budgetMB: 8, render });
+  const source = new Blob([new Uint8Array(MB)]);
+  const keys = Array.from({ length: N }, () => cache.add(source));
+  check("sources alone are over the budget", cache.sourceBytes > cache.budget);
+
+  for (const key of keys) await show(cache, key);
+  for (let pass = 0; pass < 5; pass++) {
+    for (const key of keys) await show(cache, key);
+  }
+  check(`each of ${N} keys renders once`, keys.every(key => renders.get(key) === 1));
+  check("renditions stay within the budget", cache.used <= cache.budget);
+
+  // Two rows on screen, re-rendering each other's updates
+  renders.clear();
+  const [a, b] = keys;
+  for (let pass = 0; pass < 10; pass++) {
+    await show(cache, a);
+    await show(cache, b);
+  }
+  check("two visible rows don't evict one another", !renders.size);
+
+  // Renditions past the budget are still evicted, least recently used first
+  const small = new ImageCache({ budgetMB: 8, render: async (key, blob, sizes) => ({ renditions: sizes.map(() => new Blob([new Uint8Array(MB)])) }) });
+  const bigKeys = Array.from({ length: 6 }, () => small.add(source));
+  for (const key of bigKeys) await show(small, key);
+  check("oldest renditions are evicted past the budget", !small.url(bigKeys[0], "thumb") && !!small.url(bigKeys[5], "thumb"));
+
+  cache.clear();
+  check("clear releases sources and renditions", cache.sourceBytes === 0 && cache.used === 0);
+}
+
+testImageCache().then(() => {
+  if (failures) process.exitCode = 1;
+});
@@ -0,0 +1,45 @@
+/**
+ * LCL crossover checks (lclCrossoverWM in lib/pricing-engine.js): the W/M returned is where
+ * LCL reaches the container price for good, including tier tables whose all-units steps
+ * drop the cost back under it, checked against a fine scan of lclCost.
+ * Run: node test_lcl_crossover.js
+ */
+
+const { lclCost, lclCrossoverWM, parseLclTiers } = require("./lib/pricing-engine.js");
+
+let failures = 0;
+const check = (label, ok) => {
+  console.log(`${ok ? "PASS" : "FAIL"} ${label}`);
+  if (!ok) failures++;
+};
+
+const lcl = (tiers, fixed = 0, minCharge = 0) => ({ tiers: parseLclTiers(tiers), fixed, minCharge });
+
+// Last scanned W/M (0.01 steps up to 200) where LCL is still under fcl, plus a step
+const scanFrom = (params, fcl) => {
+  let last = -1;
+  for (let k = 1; k <= 20000; k++) if (lclCost(params, k / 100) < fcl - 1e-9) last = k;
+  return last < 0 ? 0 : last === 20000 ? Infinity : (last + 1) / 100;
+};
+
+const stepped = lcl("0:100, 5:50");
+check("a tier step past the container price is skipped", lclCrossoverWM(stepped, 400) === 8);
+check("LCL stays under the container price before it", lclCost(stepped, 6) < 400 && lclCost(stepped, 8) >= 400);
+check("default tiers", Math.abs(lclCrossoverWM(lcl("0:85, 5:70, 15:60", 150, 100), 2800) - 2650 / 60) < 1e-9);
+check("fees over the container price cross at once", lclCrossoverWM(lcl("0:85", 300, 100), 350) === 0);
+
+const tables = ["0:100, 5:50", "0:120, 3:60, 10:55, 20:20", "0:85, 5:70, 15:60", "0:40, 2:90", "0:200, 1:30, 4:100"];
+const bad = [];
+for (const tiers of tables) {
+  for (const [fixed, minCharge] of [[0, 0], [150, 100], [50, 400]]) {
+    for (const fcl of [200, 400, 900, 1800, 2800]) {
+      const params = lcl(tiers, fixed, minCharge);
+      const got = lclCrossoverWM(params, fcl), want = scanFrom(params, fcl);
+      const ok = got === want || Math.abs(got - want) <= 0.011;
+      if (!ok) bad.push(`${tiers} fixed ${fixed} min ${minCharge} fcl ${fcl}: ${got} vs ${want}`);
+    }
+  }
+}
+check(`crossover matches a scan of lclCost${bad.length ? ` (${bad.slice(0, 3).join("; ")})` : ""}`, !bad.length);
+
+if (failures) process.exitCode = 1;
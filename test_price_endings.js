@@ -0,0 +1,55 @@
+/**
+ * Price-ending snapper checks (lib/pricing-engine.js): a price already on an allowed ending
+ * keeps it, snapping twice changes nothing, and nearest-up matches a plain candidate scan.
+ * Run: node test_price_endings.js
+ */
+
+const { compileEndingSnapper } = require("./lib/pricing-engine.js");
+
+const ENDING_SETS = [[0.49, 0.99], [0.95], [0, 0.5], [0.29, 0.79, 0.99]];
+let failures = 0;
+
+const check = (label, bad) => {
+  console.log(`${bad.length ? "FAIL" : "PASS"} ${label}${bad.length ? ` (${bad.length}, e.g. ${bad.slice(0, 3).join("; ")})` : ""}`);
+  failures += bad.length ? 1 : 0;
+};
+
+// Smallest pounds + ending at or above price, by brute force
+const scanUp = (price, endings) => {
+  let best = Infinity;
+  for (let p = Math.floor(price) - 1; p <= Math.floor(price) + 1; p++) {
+    for (const e of endings) if (p + e >= price - 1e-9 && p + e < best) best = p + e;
+  }
+  return best;
+};
+
+for (const endings of ENDING_SETS) {
+  for (const allowDown of [false, true]) {
+    const snap = compileEndingSnapper({ mode: "nearest", endings, allowDown, tolerancePct: 5 });
+    const label = `[${endings.join(", ")}]${allowDown ? " allowDown" : ""}`;
+
+    const kept = [];
+    for (let n = 0; n < 1000; n++) {
+      for (const e of endings) if (snap(n + e) !== n + e) kept.push(`${n + e} -> ${snap(n + e)}`);
+    }
+    check(`${label}: prices on an ending are kept`, kept);
+
+    const idempotent = [];
+    for (let pence = 0; pence <= 50000; pence++) {
+      const once = snap(pence / 100);
+      if (snap(once) !== once) idempotent.push(`${pence / 100} -> ${once} -> ${snap(once)}`);
+    }
+    check(`${label}: snapping is idempotent`, idempotent);
+
+    if (!allowDown) {
+      const scan = [];
+      for (let pence = 0; pence <= 50000; pence++) {
+        const price = pence / 100;
+        if (Math.abs(snap(price) - scanUp(price, endings)) > 1e-9) scan.push(`${price} -> ${snap(price)}`);
+      }
+      check(`${label}: matches the candidate scan`, scan);
+    }
+  }
+}
+
+process.exitCode = failures ? 1 : 0;
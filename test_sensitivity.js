@@ -0,0 +1,84 @@
+/**
+ * Sensitivity cube checks (priceSensitivity in lib/pricing-engine.js): a zero sea rate with
+ * ordered freight stays finite, freight that is a multiple of the sea rate moves with the
+ * sea axis, and LCL and auto-mix freight stay fixed along it.
+ * Run: node test_sensitivity.js
+ */
+
+const {
+  pricingParams, makePriceColumns, priceBatch, priceSensitivity, consolidateCatalog, selectContainers
+} = require("./lib/pricing-engine.js");
+
+let failures = 0;
+const check = (label, ok) => {
+  console.log(`${ok ? "PASS" : "FAIL"} ${label}`);
+  if (!ok) failures++;
+};
+
+// Three ordered SKUs of 60x40x30 cm cartons
+const catalog = (qty) => {
+  const cols = makePriceColumns(3);
+  cols.qty = new Float64Array(3);
+  [12.5, 8, 30].forEach((usd, i) => {
+    cols.unitUSD[i] = usd;
+    cols.pack[i] = i + 1;
+    cols.L[i] = 60; cols.W[i] = 40; cols.H[i] = 30;
+    cols.weight[i] = 12;
+    cols.qty[i] = qty;
+  });
+  return cols;
+};
+const opts = { marginPct: 30, commissionPct: 0, ppCost: 0 };
+const axes = { fx: [1.3], sea: [0, 1400, 2800, 4200], margin: [30] };
+const finite = (cube) => cube.sell.every(Number.isFinite) && cube.margin.every(Number.isFinite);
+const sellAt = (cube, i, s) => cube.sell[i * cube.nS + s];
+
+// Consolidated order at a zero sea rate: every grid point priced as if consolidated at it
+{
+  const cols = catalog(400);
+  const p = pricingParams({ seaFreightGBP: "0", fxGbpToUsd: "1.3" }, opts);
+  const { freight, freightPerSea } = consolidateCatalog(cols, p);
+  const cube = priceSensitivity({ ...cols, freight, freightPerSea }, p, axes);
+  check("sea 0 with ordered freight stays finite", finite(cube));
+  const same = axes.sea.every((sea, s) => {
+    const at = { ...p, sea };
+    const fresh = consolidateCatalog(cols, at);
+    const priced = priceBatch({ ...cols, freight: fresh.freight }, at);
+    return [0, 1, 2].every(i => Math.abs(sellAt(cube, i, s) - priced.sell[i]) < 0.01);
+  });
+  check("consolidated freight follows the sea axis", same);
+}
+
+// The current sea rate reproduces the priced catalog
+{
+  const cols = catalog(400);
+  const p = pricingParams({ seaFreightGBP: "2800", fxGbpToUsd: "1.3" }, opts);
+  const { freight, freightPerSea } = consolidateCatalog(cols, p);
+  const priced = priceBatch({ ...cols, freight }, p);
+  const cube = priceSensitivity({ ...cols, freight, freightPerSea }, p, axes);
+  check("current sea rate matches priceBatch", [0, 1, 2].every(i => Math.abs(sellAt(cube, i, 2) - priced.sell[i]) < 0.01));
+}
+
+// LCL and auto-mix freight have their own rates, so the sea axis leaves them alone
+for (const [label, g, qty] of [
+  ["LCL", { seaFreightGBP: "2800", lclEnabled: true }, 2],
+  ["auto mix", { seaFreightGBP: "0", containerMode: "auto" }, 500]
+]) {
+  const cols = catalog(qty);
+  const p = pricingParams({ fxGbpToUsd: "1.3", ...g }, opts);
+  const sel = selectContainers(cols, p);
+  const cube = priceSensitivity({ ...cols, freight: sel.freight, freightPerSea: sel.freightPerSea }, p, axes);
+  check(`${label} stays finite`, finite(cube) && sel.freight[0] > 0);
+  check(`${label} freight is fixed across the sea axis`, [0, 1, 2].every(i => axes.sea.every((_, s) => sellAt(cube, i, s) === sellAt(cube, i, 0))));
+}
+
+// Fixed container type with LCL on: a row that ships FCL moves with the sea rate
+{
+  const cols = catalog(900);
+  const p = pricingParams({ seaFreightGBP: "2800", fxGbpToUsd: "1.3", lclEnabled: true }, opts);
+  const sel = selectContainers(cols, p);
+  const cube = priceSensitivity({ ...cols, freight: sel.freight, freightPerSea: sel.freightPerSea }, p, axes);
+  check("fixed-type container freight follows the sea axis", !sel.lcl[0] && sellAt(cube, 0, 3) > sellAt(cube, 0, 2) && sellAt(cube, 0, 1) < sellAt(cube, 0, 2));
+}
+
+if (failures) process.exitCode = 1;